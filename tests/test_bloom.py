@@ -0,0 +1,90 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import requests_mock
+import simplejson as json
+from voldemort_client.bloom import BloomFilter, NegativeLookupFilter
+from voldemort_client.client import VoldemortCluster
+
+class TestNegativeLookupFilter:
+    """
+    This is the test class for the negative lookup filter.
+    """
+
+    def test_bloom_filter(self):
+        """
+        Test that added keys are found and the bits need little memory.
+        """
+        bloom = BloomFilter(1000)
+        for number in range(1000):
+            bloom.add(str(number))
+        assert all(str(number) in bloom for number in range(1000))
+        assert 0.02 > bloom.error_rate
+        assert 1300 > bloom.memory
+
+    def test_not_seeded(self):
+        """
+        Test that a filter without seed doesn't answer locally.
+        """
+        assert NegativeLookupFilter(capacity=10).might_contain("k")
+
+    def test_client_skips_absent_keys(self):
+        """
+        Test that the client answers absent keys without a request.
+        """
+        lookup_filter = NegativeLookupFilter(capacity=100)
+        lookup_filter.seed(["a"])
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/a", status_code=404)
+            mock.post("http://localhost:8082/test1/b", status_code=204)
+            cluster = VoldemortCluster([("http://localhost:8082", 0)])
+            cluster.set_lookup_filter("test1", lookup_filter)
+            client = cluster.store("test1")
+            assert None == client.get("b")
+            assert 0 == mock.call_count
+            mock.get("http://localhost:8082/test1/b", status_code=404)
+            assert client.set("b", "value")
+            assert lookup_filter.might_contain("b")
+            assert None == client.get("a")
+        stats = lookup_filter.stats()
+        assert 1 == stats["absent"]
+        assert 1 == stats["false_positives"]
+
+    def test_delete_keeps_other_keys(self):
+        """
+        Test that deleting a false positive doesn't hide an existing key.
+        """
+        lookup_filter = NegativeLookupFilter(capacity=1, error_rate=0.5)
+        lookup_filter.seed(["a"])
+        other = next(key for key in map(str, range(1000))
+                     if key != "a" and lookup_filter.might_contain(key))
+        clock = json.dumps([{"versions": [{"nodeId": 0, "version": 1}],
+                             "timestamp": 1}])
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/%s" % other, text=clock)
+            mock.delete("http://localhost:8082/test1/%s" % other, status_code=204)
+            cluster = VoldemortCluster([("http://localhost:8082", 0)])
+            cluster.set_lookup_filter("test1", lookup_filter)
+            assert cluster.store("test1").delete(other)
+        assert lookup_filter.might_contain("a")
+
+    def test_deleted_key_not_false_positive(self):
+        """
+        Test that a miss of a key which this client deleted isn't counted as
+        false positive.
+        """
+        lookup_filter = NegativeLookupFilter(capacity=100)
+        lookup_filter.seed(["a"])
+        lookup_filter.remove("a")
+        lookup_filter.record_miss("a")
+        assert 0 == lookup_filter.stats()["false_positives"]
@@ -0,0 +1,100 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import requests_mock
+from voldemort_client import cache as cache_module
+from voldemort_client.cache import SharedMemoryCache
+from voldemort_client.client import VoldemortCluster
+
+class TestSharedMemoryCache:
+    """
+    This is the test class for the SharedMemoryCache class.
+    """
+
+    def test_set_get(self, tmp_path):
+        """
+        Test that a cached value can be read again.
+        """
+        cache = SharedMemoryCache(str(tmp_path / "cache"), slots=16, ways=4)
+        assert cache.set(b"k", b"value")
+        assert b"value" == cache.get(b"k")
+        cache.delete(b"k")
+        assert None == cache.get(b"k")
+
+    def test_value_too_large(self, tmp_path):
+        """
+        Test that values bigger than a slot are not cached.
+        """
+        cache = SharedMemoryCache(str(tmp_path / "cache"), slots=16, ways=4,
+                                  slot_size=64)
+        assert not cache.set(b"k", b"x" * 64)
+        assert None == cache.get(b"k")
+
+    def test_least_recently_read_evicted(self, tmp_path, monkeypatch):
+        """
+        Test that a full bucket reuses the least recently read slot.
+        """
+        clock = iter(range(1, 100))
+        monkeypatch.setattr(cache_module, "_now_ms", lambda: next(clock))
+        cache = SharedMemoryCache(str(tmp_path / "cache"), slots=2, ways=2)
+        cache.set(b"a", b"1")
+        cache.set(b"b", b"2")
+        cache.get(b"a")
+        cache.set(b"c", b"3")
+        assert b"1" == cache.get(b"a")
+        assert None == cache.get(b"b")
+        assert b"3" == cache.get(b"c")
+
+    def test_shared_after_fork(self, tmp_path):
+        """
+        Test that a value written by a forked process is visible.
+        """
+        cache = SharedMemoryCache(str(tmp_path / "cache"), slots=16, ways=4)
+        pid = os.fork()
+        if pid == 0:
+            cache.set(b"k", b"child")
+            os._exit(0)
+        os.waitpid(pid, 0)
+        assert b"child" == cache.get(b"k")
+
+    def test_client_reads_cache(self, tmp_path):
+        """
+        Test that the client doesn't ask the cluster for cached values.
+        """
+        cache = SharedMemoryCache(str(tmp_path / "cache"), slots=16, ways=4)
+        cache.set(b"test1/k", b"value")
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/b", status_code=404)
+            cluster = VoldemortCluster([("http://localhost:8082", 0)],
+                                       cache=cache)
+            client = cluster.store("test1")
+            assert "value" == client.get("k")
+            assert {"k": "value"} == client.get_many(["k", "b"])
+            assert 1 == mock.call_count
+
+    def test_client_fetches_one_missing_key(self, tmp_path):
+        """
+        Test that a cached key and one fetched key are both returned.
+        """
+        cache = SharedMemoryCache(str(tmp_path / "cache"), slots=16, ways=4)
+        cache.set(b"test1/k", b"value")
+        body = (b"--boundary\r\nContent-Type: text/plain\r\n"
+                b"X-VOLD-Vector-Clock: {}\r\n\r\nother\r\n--boundary--\r\n")
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/b", content=body)
+            cluster = VoldemortCluster([("http://localhost:8082", 0)],
+                                       cache=cache)
+            client = cluster.store("test1")
+            assert {"k": "value", "b": "other"} == client.get_many(["k", "b"])
+            assert b"other" == cache.get(b"test1/b")
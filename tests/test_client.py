@@ -15,10 +15,13 @@ from email import encoders
 from email.mime.application import MIMEApplication
 from email.mime.message import MIMEMessage
 from email.message import Message
+import time
+import pytest
+import requests
 import requests_mock
 import simplejson as json
 from voldemort_client import helper
-from voldemort_client.client import VoldemortClient
+from voldemort_client.client import VoldemortClient, VoldemortCluster
 
 class TestVoldemortClient:
     """
@@ -43,3 +46,175 @@ class TestVoldemortClient:
             client = VoldemortClient([("http://localhost:8082", 0)], "test1")
             result = client.get_many(["a", "b", "c"])
             assert None == result
+
+class TestVoldemortCluster:
+    """
+    This is the test class for the VoldemortCluster class.
+    """
+
+    def test_store_shares_cluster(self):
+        """
+        Test that the store handles share the cluster resources.
+        """
+        cluster = VoldemortCluster([("http://localhost:8082", 0)])
+        first = cluster.store("test1")
+        second = cluster.store("test2")
+        assert first.cluster is cluster
+        assert second.cluster is cluster
+
+    def test_store_get_notexists(self):
+        """
+        Test the get method of a store handle with a not existing key.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test2/k", status_code=404)
+            cluster = VoldemortCluster([("http://localhost:8082", 0)])
+            assert None == cluster.store("test2").get("k")
+
+    def test_failed_node_moved_to_end(self):
+        """
+        Test that a node without connection is asked last.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k",
+                     exc=requests.exceptions.ConnectionError)
+            mock.get("http://localhost:8083/test1/k", status_code=404)
+            cluster = VoldemortCluster([("http://localhost:8082", 0),
+                                        ("http://localhost:8083", 1)])
+            assert None == cluster.store("test1").get("k")
+            assert [1, 0] == [node[1] for node in cluster.nodes()]
+
+class TestVoldemortClientUpdate:
+    """
+    This is the test class for the update method of the VoldemortClient class.
+    """
+
+    def test_update_retries_on_conflict(self):
+        """
+        Test that the update is retried if the version is obsolete.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k",
+                     [{"content": _versioned_body("1", 1)},
+                      {"content": _versioned_body("5", 2)}])
+            mock.post("http://localhost:8082/test1/k",
+                      [{"status_code": 412}, {"status_code": 204}])
+            client = VoldemortClient([("http://localhost:8082", 0)], "test1")
+            assert client.update("k", lambda value: str(int(value) + 1),
+                                 backoff=0)
+            assert "6" == mock.request_history[-1].text
+            clock = json.loads(mock.request_history[-1].headers["X-VOLD-Vector-Clock"])
+            assert [{"nodeId": 0, "version": 3}] == clock["versions"]
+            assert 1 == client.update_stats["conflicts"]
+            assert 2 == client.update_stats["attempts"]
+
+    def test_update_gives_up(self):
+        """
+        Test that the update stops after the maximal attempts.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k", status_code=404)
+            mock.post("http://localhost:8082/test1/k", status_code=412)
+            client = VoldemortClient([("http://localhost:8082", 0)], "test1")
+            assert not client.update("k", lambda value: "1", max_attempts=2,
+                                     backoff=0)
+            assert 1 == client.update_stats["exhausted"]
+
+    def test_update_stats_shared(self):
+        """
+        Test that the update counters are shared by the handles of a store.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k", status_code=404)
+            mock.post("http://localhost:8082/test1/k", status_code=204)
+            cluster = VoldemortCluster([("http://localhost:8082", 0)])
+            assert cluster.store("test1").update("k", lambda value: "1")
+            assert 1 == cluster.store("test1").update_stats["attempts"]
+            assert 0 == cluster.store("test2").update_stats["attempts"]
+
+
+def _versioned_body(value, version):
+    clock = json.dumps({"versions": [{"nodeId": 0, "version": version}],
+                        "timestamp": 0})
+    return ("--boundary\r\nContent-Type: text/plain\r\n"
+            "X-VOLD-Vector-Clock: %s\r\n\r\n%s\r\n--boundary--\r\n"
+            % (clock, value)).encode()
+
+class TestVoldemortClusterZones:
+    """
+    This is the test class for the zone handling of the VoldemortCluster class.
+    """
+
+    SERVERS = [("http://node0:8082", 0, 0), ("http://node1:8082", 1, 1),
+               ("http://node2:8082", 2, 1)]
+
+    def test_from_cluster_xml(self, tmp_path):
+        """
+        Test that the nodes and zones are read from the cluster.xml.
+        """
+        path = tmp_path / "cluster.xml"
+        path.write_text("<cluster><name>c</name>"
+                        "<zone><zone-id>0</zone-id></zone>"
+                        "<server><id>0</id><host>node0</host><rest-port>8082</rest-port>"
+                        "<zone-id>0</zone-id></server>"
+                        "<server><id>1</id><host>node1</host><rest-port>8083</rest-port>"
+                        "<zone-id>1</zone-id></server></cluster>")
+        cluster = VoldemortCluster.from_cluster_xml(str(path), local_zone=1)
+        assert [("http://node1:8083", 1, 1), ("http://node0:8082", 0, 0)] == cluster.nodes(read=True)
+        assert [0, 1] == [node[1] for node in cluster.nodes()]
+
+    def test_cluster_xml_without_rest_port(self, tmp_path):
+        """
+        Test that a node without rest-port is reported.
+        """
+        path = tmp_path / "cluster.xml"
+        path.write_text("<cluster><name>c</name>"
+                        "<server><id>3</id><host>node0</host></server></cluster>")
+        with pytest.raises(ValueError, match="node 3"):
+            VoldemortCluster.from_cluster_xml(str(path))
+
+    def test_example_cluster_xml(self):
+        """
+        Test that a cluster.xml without zones is read as zone 0.
+        """
+        cluster = VoldemortCluster.from_cluster_xml(
+            "server_config/test_cluster/config/cluster.xml")
+        assert [("http://localhost:8082", 0, 0)] == cluster.nodes()
+
+    def test_local_zone_failed(self):
+        """
+        Test that the other zones are asked if the local zone failed.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://node1:8082/test1/k",
+                     exc=requests.exceptions.ConnectionError)
+            mock.get("http://node2:8082/test1/k", status_code=404)
+            mock.get("http://node0:8082/test1/k", status_code=404)
+            cluster = VoldemortCluster(self.SERVERS, local_zone=1)
+            assert None == cluster.store("test1").get("k")
+            assert [2, 0, 1] == [node[1] for node in cluster.nodes(read=True)]
+
+    def test_faster_remote_zone(self):
+        """
+        Test that a much faster node of another zone is read first.
+        """
+        cluster = VoldemortCluster(self.SERVERS, local_zone=1)
+        cluster._latencies = {0: 0.01, 1: 0.1, 2: 0.2}
+        assert [0, 1, 2] == [node[1] for node in cluster.nodes(read=True)]
+        cluster._latencies = {0: 0.08, 1: 0.1, 2: 0.2}
+        assert [1, 2, 0] == [node[1] for node in cluster.nodes(read=True)]
+
+    def test_remote_zone_probed(self):
+        """
+        Test that one read per interval goes to a node of another zone and that
+        old latencies of such nodes are not used.
+        """
+        cluster = VoldemortCluster(self.SERVERS, local_zone=1,
+                                   zone_probe_interval=10)
+        cluster._probed[0] = time.monotonic() - 10
+        assert [0, 1, 2] == [node[1] for node in cluster.nodes(read=True)]
+        assert [1, 2, 0] == [node[1] for node in cluster.nodes(read=True)]
+        cluster._latencies = {0: 0.01, 1: 0.1, 2: 0.2}
+        cluster._measured = {0: time.monotonic() - 25, 1: time.monotonic()}
+        cluster._probed[0] = time.monotonic()
+        assert [1, 2, 0] == [node[1] for node in cluster.nodes(read=True)]
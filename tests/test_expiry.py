@@ -0,0 +1,112 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import requests
+import requests_mock
+import simplejson as json
+from voldemort_client.client import VoldemortCluster
+from voldemort_client.expiry import ExpiryIndex, ExpirySweeper
+
+class TestExpiryIndex:
+    """
+    This is the test class for the ExpiryIndex class.
+    """
+
+    def test_pop_due(self):
+        """
+        Test that only due keys are returned in the order of the expire time.
+        """
+        index = ExpiryIndex()
+        index.add("a", 30)
+        index.add("b", 10)
+        index.add("c", 50)
+        index.add("a", 20)
+        assert [("b", 10), ("a", 20)] == index.pop_due(10, now=40)
+        assert 1 == len(index)
+
+    def test_pop_due_limit(self):
+        """
+        Test that the number of returned keys is limited.
+        """
+        index = ExpiryIndex()
+        for number in range(5):
+            index.add(str(number), number)
+        assert 2 == len(index.pop_due(2, now=10))
+        assert 3 == len(index)
+
+
+class TestExpirySweeper:
+    """
+    This is the test class for the expiry handling of the client.
+    """
+
+    def test_expired_key_is_miss(self):
+        """
+        Test that an expired key is not fetched from the cluster.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k", status_code=404)
+            mock.post("http://localhost:8082/test1/k", status_code=204)
+            client = VoldemortCluster([("http://localhost:8082", 0)]).store("test1")
+            assert client.set("k", "value", timeout=1)
+            count = mock.call_count
+            assert None == client.get("k")
+            assert count == mock.call_count
+
+    def test_sweep_deletes_due_keys(self):
+        """
+        Test that the sweeper deletes the due keys.
+        """
+        clock = json.dumps([{"versions": [{"nodeId": 0, "version": 1}],
+                             "timestamp": 1}])
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k", text=clock)
+            mock.delete("http://localhost:8082/test1/k", status_code=204)
+            cluster = VoldemortCluster([("http://localhost:8082", 0)])
+            cluster.expiry("test1").add("k", 1)
+            assert 1 == ExpirySweeper(cluster).sweep()
+            assert 0 == len(cluster.expiry("test1"))
+            assert "DELETE" == mock.request_history[-1].method
+
+    def test_failed_sweep_keeps_keys(self):
+        """
+        Test that the due keys stay in the index if the cluster isn't
+        reachable.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/a",
+                     exc=requests.exceptions.ConnectionError)
+            mock.get("http://localhost:8082/test1/b",
+                     exc=requests.exceptions.ConnectionError)
+            cluster = VoldemortCluster([("http://localhost:8082", 0)])
+            cluster.expiry("test1").add("a", 1)
+            cluster.expiry("test1").add("b", 2)
+            assert 0 == ExpirySweeper(cluster).sweep()
+            assert 2 == len(cluster.expiry("test1"))
+            assert 1 == mock.call_count
+
+    def test_written_again_not_deleted(self):
+        """
+        Test that a key which is written again after it was due isn't deleted.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k", status_code=404)
+            mock.post("http://localhost:8082/test1/k", status_code=204)
+            cluster = VoldemortCluster([("http://localhost:8082", 0)])
+            client = cluster.store("test1")
+            index = cluster.expiry("test1")
+            index.add("k", 1)
+            [(key, expires)] = index.pop_due(10)
+            assert client.set("k", "value")
+            assert not client.expire(key, expires)
+            assert "DELETE" not in [request.method for request in mock.request_history]
@@ -0,0 +1,100 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import requests
+import requests_mock
+from voldemort_client.client import VoldemortCluster
+from voldemort_client.handoff import HandoffReplayer, HintedHandoffQueue
+
+class TestHintedHandoffQueue:
+    """
+    This is the test class for the HintedHandoffQueue class.
+    """
+
+    def test_reopen(self, tmp_path):
+        """
+        Test that only the latest pending write of a key survives a restart.
+        """
+        queue = HintedHandoffQueue(str(tmp_path))
+        queue.enqueue("set", "test1", "a", "1")
+        queue.enqueue("set", "test1", "a", "2")
+        queue.enqueue("delete", "test1", "b")
+        queue.ack(queue.pending()[-1])
+        queue.close()
+        queue = HintedHandoffQueue(str(tmp_path))
+        assert [("test1", "a", "2")] == [(record["store"], record["key"], record["value"])
+                                         for record in queue.pending()]
+        assert 1 == len(os.listdir(str(tmp_path)))
+
+    def test_torn_record(self, tmp_path):
+        """
+        Test that a torn record at the end of the log is dropped.
+        """
+        queue = HintedHandoffQueue(str(tmp_path))
+        queue.enqueue("set", "test1", "a", "1")
+        queue.close()
+        segment = os.path.join(str(tmp_path), os.listdir(str(tmp_path))[0])
+        with open(segment, "ab") as log:
+            log.write(b"\x10\x00\x00\x00\x00")
+        assert 1 == len(HintedHandoffQueue(str(tmp_path)))
+
+    def test_failed_set_replayed(self, tmp_path):
+        """
+        Test that a set which failed on every node is sent again later.
+        """
+        queue = HintedHandoffQueue(str(tmp_path))
+        cluster = VoldemortCluster([("http://localhost:8082", 0)], handoff=queue)
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k",
+                     exc=requests.exceptions.ConnectionError)
+            assert not cluster.store("test1").set("k", "value")
+        assert 1 == len(queue)
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k", status_code=404)
+            mock.post("http://localhost:8082/test1/k", status_code=204)
+            assert 1 == HandoffReplayer(cluster, queue).replay()
+            assert "value" == mock.request_history[-1].text
+        assert 0 == len(queue)
+
+    def test_rejected_write_dropped(self, tmp_path):
+        """
+        Test that a write which the cluster rejects doesn't block the others.
+        """
+        queue = HintedHandoffQueue(str(tmp_path))
+        queue.enqueue("set", "test1", "bad", "1")
+        queue.enqueue("set", "test1", "good", "2")
+        cluster = VoldemortCluster([("http://localhost:8082", 0)], handoff=queue)
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/bad", status_code=404)
+            mock.get("http://localhost:8082/test1/good", status_code=404)
+            mock.post("http://localhost:8082/test1/bad", status_code=400)
+            mock.post("http://localhost:8082/test1/good", status_code=204)
+            assert 2 == HandoffReplayer(cluster, queue).replay()
+        assert 0 == len(queue)
+
+    def test_round_stops_when_unreachable(self, tmp_path):
+        """
+        Test that a round stops at the first write which finds the cluster
+        unreachable.
+        """
+        queue = HintedHandoffQueue(str(tmp_path))
+        for number in range(5):
+            queue.enqueue("set", "test1", str(number), "1")
+        cluster = VoldemortCluster([("http://localhost:8082", 0)], handoff=queue)
+        with requests_mock.Mocker() as mock:
+            mock.register_uri(requests_mock.ANY, requests_mock.ANY,
+                              exc=requests.exceptions.ConnectionError)
+            assert 0 == HandoffReplayer(cluster, queue).replay()
+            assert 1 == mock.call_count
+        assert 5 == len(queue)
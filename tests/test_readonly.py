@@ -0,0 +1,102 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import pytest
+from voldemort_client import readonly as readonly_module
+from voldemort_client.readonly import (ReadOnlyStore, ReadOnlyStoreBuilder,
+                                       chunk, master_partition)
+
+class TestReadOnlyStore:
+    """
+    This is the test class for the read-only store builder and lookup engine.
+    """
+
+    def test_build_and_lookup(self, tmpdir):
+        """
+        Test that every built key is found and absent keys are not.
+        """
+        pairs = [("key%d" % number, "value%d" % number) for number in range(500)]
+        builder = ReadOnlyStoreBuilder(str(tmpdir), 4, num_chunks=2, processes=2)
+        assert {"keys": 500, "chunks": 8} == builder.build(pairs)
+        assert 17 == len(os.listdir(str(tmpdir)))
+        store = ReadOnlyStore(str(tmpdir), 4, num_chunks=2)
+        assert all(("value%d" % number).encode() == bytes(store.get("key%d" % number))
+                   for number in range(500))
+        assert store.get("absent") is None
+        store.close()
+
+    def test_sorted_index(self, tmpdir):
+        """
+        Test that the files are named and sorted like voldemort expects.
+        """
+        builder = ReadOnlyStoreBuilder(str(tmpdir), 1, processes=1)
+        builder.build([("b", "2"), ("a", "1"), ("a", "3")])
+        with open(str(tmpdir.join("0_0_0.index")), "rb") as index:
+            entries = index.read()
+        assert 24 == len(entries)
+        assert entries[:8] < entries[12:20]
+        store = ReadOnlyStore(str(tmpdir), 1)
+        assert b"3" == bytes(store.get("a"))
+        store.close()
+
+    def test_replicas(self, tmpdir):
+        """
+        Test that every replica is written to another node.
+        """
+        builder = ReadOnlyStoreBuilder(str(tmpdir), 4, replication_factor=2,
+                                       partition_owners={0: 0, 1: 1, 2: 0, 3: 1},
+                                       processes=1)
+        builder.build([("key%d" % number, "value") for number in range(50)])
+        for node_id in (0, 1):
+            store = ReadOnlyStore(str(tmpdir.join("node-%d" % node_id)), 4)
+            assert all(b"value" == bytes(store.get("key%d" % number))
+                       for number in range(50))
+            store.close()
+
+    def test_routing(self):
+        """
+        Test the partition and chunk of a key.
+        """
+        assert (2 ** 32 - 0x811c9dc5) % 1000 == master_partition(b"", 1000)
+        assert 0 <= master_partition(b"key", 7) < 7
+        assert 0 <= chunk(b"key", 3) < 3
+        assert (2 ** 31 - 1) % 7 == readonly_module._routing_abs(-2 ** 31) % 7
+
+    def test_invalid(self, tmpdir):
+        """
+        Test that replicas need the owners of the partitions.
+        """
+        with pytest.raises(ValueError):
+            ReadOnlyStoreBuilder(str(tmpdir), 4, replication_factor=2)
+
+    def test_chunk_of_minimal_int(self, monkeypatch):
+        """
+        Test that a md5 hash starting with the minimal int is widened like in
+        the server.
+        """
+        class Digest:
+            def digest(self):
+                return b"\x80" + b"\x00" * 15
+        monkeypatch.setattr(readonly_module.hashlib, "md5", lambda key: Digest())
+        assert 2 ** 31 % 3 == chunk(b"key", 3)
+
+    def test_close_with_held_value(self, tmpdir):
+        """
+        Test that the store can be closed while a value is still held.
+        """
+        ReadOnlyStoreBuilder(str(tmpdir), 1, processes=1).build([("a", "1")])
+        with ReadOnlyStore(str(tmpdir), 1) as store:
+            value = store.get("a")
+        assert b"1" == bytes(value)
+        assert store.get("a") is None
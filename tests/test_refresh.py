@@ -0,0 +1,120 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import requests_mock
+import simplejson as json
+from voldemort_client.cache import SharedMemoryCache
+from voldemort_client.client import VoldemortClient, VoldemortCluster
+from voldemort_client.refresh import RefreshAheadLoader
+
+class FakeClient:
+    """
+    This is a client which holds the values in memory and counts the calls.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append(("get", key))
+        return self.values.get(key, (None, None))[0]
+
+    def get_versioned(self, key):
+        self.calls.append(("get_versioned", key))
+        return self.values.get(key, (None, None))
+
+    def get_version(self, key):
+        self.calls.append(("get_version", key))
+        return self.values.get(key, (None, None))[1]
+
+
+class TestRefreshAheadLoader:
+    """
+    This is the test class for the RefreshAheadLoader class.
+    """
+
+    def test_refetch_only_changed(self):
+        """
+        Test that only values with a new version are fetched again.
+        """
+        client = FakeClient()
+        client.values = {"a": ("1", {"version": 1}), "b": ("2", {"version": 1})}
+        loader = RefreshAheadLoader(client)
+        loader.register(["a", "b"])
+        assert 2 == loader.refresh()
+        client.values["b"] = ("3", {"version": 2})
+        assert 1 == loader.refresh()
+        assert ("get_versioned", "b") == client.calls[-1]
+        client.calls.clear()
+        assert "1" == loader.get("a")
+        assert "3" == loader.get("b")
+        assert [] == client.calls
+
+    def test_hot_key_registered(self):
+        """
+        Test that a key is registered after enough reads.
+        """
+        client = FakeClient()
+        client.values = {"a": ("1", {"version": 1})}
+        loader = RefreshAheadLoader(client, hot_threshold=2)
+        loader.get("a")
+        loader.get("a")
+        loader.refresh()
+        client.calls.clear()
+        assert "1" == loader.get("a")
+        assert [] == client.calls
+
+    def test_refetch_one_key_with_client(self):
+        """
+        Test that one changed key is fetched with one request.
+        """
+        clock = {"versions": [{"nodeId": 0, "version": 1}], "timestamp": 0}
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k",
+                     content=_versioned_body("value", clock))
+            mock.get("http://localhost:8082/test1/k", text=json.dumps([clock]),
+                     request_headers={"X-VOLD-Get-Version": ""})
+            client = VoldemortClient([("http://localhost:8082", 0)], "test1")
+            loader = RefreshAheadLoader(client)
+            loader.register(["k"])
+            assert 1 == loader.refresh()
+            requests = mock.call_count
+            assert "value" == loader.get("k")
+            assert requests == mock.call_count
+
+    def test_refetch_skips_cache(self, tmp_path):
+        """
+        Test that a value which another host changed isn't taken from the
+        cache.
+        """
+        cache = SharedMemoryCache(str(tmp_path / "cache"), slots=16, ways=4)
+        cache.set(b"test1/k", b"old")
+        clock = {"versions": [{"nodeId": 0, "version": 2}], "timestamp": 0}
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k",
+                     content=_versioned_body("new", clock))
+            mock.get("http://localhost:8082/test1/k", text=json.dumps([clock]),
+                     request_headers={"X-VOLD-Get-Version": ""})
+            cluster = VoldemortCluster([("http://localhost:8082", 0)], cache=cache)
+            loader = RefreshAheadLoader(cluster.store("test1"))
+            loader.register(["k"])
+            assert 1 == loader.refresh()
+            assert "new" == loader.get("k")
+            assert 0 == loader.refresh()
+
+
+def _versioned_body(value, clock):
+    return ("--boundary\r\nContent-Type: text/plain\r\n"
+            "X-VOLD-Vector-Clock: %s\r\n\r\n%s\r\n--boundary--\r\n"
+            % (json.dumps(clock), value)).encode()
@@ -0,0 +1,107 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+import requests
+import requests_mock
+from urllib3.exceptions import NewConnectionError
+from voldemort_client.client import VoldemortCluster
+from voldemort_client.exception import UnknownWriteError
+from voldemort_client.retry import (CONFLICT, FATAL, NOT_FOUND, RETRY,
+                                    RetryBudget, RetryPolicy)
+
+SERVERS = [("http://node0:8082", 0), ("http://node1:8082", 1)]
+
+class TestRetryPolicy:
+    """
+    This is the test class for the RetryPolicy class.
+    """
+
+    def test_classify(self):
+        """
+        Test the categories of the responses and errors.
+        """
+        policy = RetryPolicy()
+        assert NOT_FOUND == policy.classify(_response(404))
+        assert CONFLICT == policy.classify(_response(412))
+        assert RETRY == policy.classify(_response(503))
+        assert FATAL == policy.classify(_response(400))
+        assert RETRY == policy.classify(error=requests.exceptions.ConnectionError())
+
+    def test_budget(self):
+        """
+        Test that the budget stops the retries.
+        """
+        policy = RetryPolicy(budget=RetryBudget(ratio=0, min_per_second=0,
+                                                capacity=1))
+        assert policy.should_retry(1, 3)
+        assert not policy.should_retry(1, 3)
+        assert 1 == policy.stats["rejected"]
+
+    def test_not_idempotent(self):
+        """
+        Test that an ambiguous failure of a not idempotent request isn't
+        retried.
+        """
+        policy = RetryPolicy()
+        assert not policy.should_retry(1, 3, requests.exceptions.ReadTimeout(),
+                                       idempotent=False)
+        assert policy.should_retry(1, 3, requests.exceptions.ConnectTimeout(),
+                                   idempotent=False)
+        assert not policy.should_retry(1, 3, requests.exceptions.ConnectionError(),
+                                       idempotent=False)
+        refused = requests.exceptions.ConnectionError(NewConnectionError(None, "refused"))
+        assert policy.should_retry(1, 3, refused, idempotent=False)
+
+    def test_client_reset_after_send(self):
+        """
+        Test that a write which may have reached a node is reported as unknown
+        and not sent to the next node.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://node0:8082/test1/k", status_code=404)
+            mock.post("http://node0:8082/test1/k",
+                      exc=requests.exceptions.ConnectionError("reset"))
+            mock.post("http://node1:8082/test1/k", status_code=412)
+            cluster = VoldemortCluster(SERVERS, retry_policy=RetryPolicy(base_delay=0))
+            with pytest.raises(UnknownWriteError):
+                cluster.store("test1").update("k", lambda value: "1")
+            assert 1 == len([request for request in mock.request_history
+                             if request.method == "POST"])
+
+    def test_client_retries_server_error(self):
+        """
+        Test that a server error is retried on the next node.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://node0:8082/test1/k", status_code=503)
+            mock.get("http://node1:8082/test1/k", status_code=404)
+            cluster = VoldemortCluster(SERVERS, retry_policy=RetryPolicy(base_delay=0))
+            assert None == cluster.store("test1").get("k")
+            assert 2 == mock.call_count
+
+    def test_client_not_found_not_retried(self):
+        """
+        Test that a missing key isn't asked on the other nodes.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://node0:8082/test1/k", status_code=404)
+            cluster = VoldemortCluster(SERVERS)
+            assert None == cluster.store("test1").get("k")
+            assert 1 == mock.call_count
+
+
+def _response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return response
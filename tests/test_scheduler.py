@@ -0,0 +1,84 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import time
+import requests_mock
+from voldemort_client.client import VoldemortCluster
+from voldemort_client.scheduler import BATCH, INTERACTIVE, RequestScheduler
+
+class TestRequestScheduler:
+    """
+    This is the test class for the RequestScheduler class.
+    """
+
+    def test_interactive_first(self):
+        """
+        Test that waiting interactive requests overtake batch requests.
+        """
+        scheduler = RequestScheduler(max_concurrency=1, reserved=0)
+        order = []
+        scheduler.acquire(0, INTERACTIVE)
+        threads = [_start(scheduler, priority, order)
+                   for priority in (BATCH, BATCH, INTERACTIVE, INTERACTIVE)]
+        _wait_queued(scheduler, 4)
+        scheduler.release(0)
+        for thread in threads:
+            thread.join()
+        assert [INTERACTIVE, INTERACTIVE, BATCH, BATCH] == order
+        assert 3 == scheduler.stats()[INTERACTIVE]["dispatched"]
+
+    def test_reserved_for_interactive(self):
+        """
+        Test that batch requests don't use the reserved capacity.
+        """
+        scheduler = RequestScheduler(max_concurrency=2, reserved=1)
+        order = []
+        scheduler.acquire(0, BATCH)
+        thread = _start(scheduler, BATCH, order)
+        _wait_queued(scheduler, 1)
+        scheduler.acquire(0, INTERACTIVE)
+        assert 1 == scheduler.stats()[BATCH]["queued"]
+        scheduler.release(0)
+        scheduler.release(0)
+        thread.join()
+        assert [BATCH] == order
+
+    def test_cluster_uses_priority(self):
+        """
+        Test that the requests of a store handle use its priority class.
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k", status_code=404)
+            scheduler = RequestScheduler()
+            cluster = VoldemortCluster([("http://localhost:8082", 0)],
+                                       scheduler=scheduler)
+            client = cluster.store("test1").with_priority(BATCH)
+            assert None == client.get("k")
+            assert 1 == scheduler.stats()[BATCH]["dispatched"]
+            assert 0 == scheduler.stats()[INTERACTIVE]["dispatched"]
+
+
+def _start(scheduler, priority, order):
+    def run():
+        scheduler.acquire(0, priority)
+        order.append(priority)
+        scheduler.release(0)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def _wait_queued(scheduler, count):
+    while sum(stats["queued"] for stats in scheduler.stats().values()) < count:
+        time.sleep(0.001)
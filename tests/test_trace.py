@@ -0,0 +1,133 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import time
+import requests_mock
+from voldemort_client.client import VoldemortClient
+from voldemort_client.trace import (HIT, MISS, RecordingClient, TraceRecorder,
+                                    TraceReplayer, read_trace)
+
+class TestTrace:
+    """
+    This is the test class for the trace recording and replay.
+    """
+
+    def test_record_raw_keys(self, tmp_path):
+        """
+        Test that the recorded operations can be read again.
+        """
+        path = str(tmp_path / "trace")
+        recorder = TraceRecorder(path, hash_keys=False)
+        with requests_mock.Mocker() as mock:
+            mock.get("http://localhost:8082/test1/k", status_code=404)
+            mock.get("http://localhost:8082/test1/a,b", status_code=404)
+            client = RecordingClient(VoldemortClient([("http://localhost:8082", 0)],
+                                                     "test1"), recorder)
+            assert None == client.get("k")
+            assert None == client.get_many(["a", "b"])
+        recorder.close()
+        records = list(read_trace(path))
+        assert ["get", "get_many"] == [record.operation for record in records]
+        assert ["a", "b"] == records[1].keys
+        assert MISS == records[0].outcome
+
+    def test_replay(self, tmp_path):
+        """
+        Test that a replay sends the recorded operations with hashed keys.
+        """
+        path = str(tmp_path / "trace")
+        recorder = TraceRecorder(path)
+        recorder.record("set", ["k"], 3, 0, 0.001, HIT)
+        recorder.record("get", ["k"], 3, 0, 0.001, HIT)
+        recorder.close()
+        with requests_mock.Mocker() as mock:
+            mock.register_uri(requests_mock.ANY, requests_mock.ANY,
+                              status_code=404)
+            client = VoldemortClient([("http://localhost:8082", 0)], "test1")
+            result = TraceReplayer(path).replay(client, speed=0)
+        assert 1 == result["get"]["count"]
+        assert 1 == result["set"]["count"]
+        key = next(read_trace(path)).keys[0]
+        assert 16 == len(key)
+        assert any(request.path.endswith(key) for request in mock.request_history)
+
+    def test_replay_includes_queueing(self, tmp_path):
+        """
+        Test that the time waiting for a worker is part of the latency.
+        """
+        path = str(tmp_path / "trace")
+        recorder = TraceRecorder(path)
+        for _ in range(3):
+            recorder.record("get", ["k"], 0, 0, 0.001, MISS)
+        recorder.close()
+
+        class SlowClient:
+            def get(self, key):
+                time.sleep(0.05)
+
+        result = TraceReplayer(path).replay(SlowClient(), concurrency=1)
+        assert 100 <= result["get"]["max"]
+
+    def test_record_large_get_many(self, tmp_path):
+        """
+        Test that too many keys or too long keys don't break the call.
+        """
+        path = str(tmp_path / "trace")
+        recorder = TraceRecorder(path, hash_keys=False)
+        recorder.record("get_many", [str(number) for number in range(70000)],
+                        0, 0, 0.001, MISS)
+        recorder.record("get", ["k" * 70000], 0, 0, 0.001, MISS)
+        recorder.close()
+        records = list(read_trace(path))
+        assert 0xFFFF == len(records[0].keys)
+        assert 0xFFFF == len(records[1].keys[0])
+
+    def test_prepare_writes_hits(self, tmp_path):
+        """
+        Test that the keys of recorded hits are written before the replay.
+        """
+        path = str(tmp_path / "trace")
+        recorder = TraceRecorder(path)
+        recorder.record("get", ["k"], 5, 0, 0.001, HIT)
+        recorder.record("get_many", ["a", "b"], 8, 0, 0.001, HIT)
+        recorder.record("get", ["m"], 0, 0, 0.001, MISS)
+        recorder.close()
+
+        class MemoryClient:
+            def __init__(self):
+                self.values = {}
+
+            def set(self, key, value):
+                self.values[key] = value
+
+        client = MemoryClient()
+        assert 3 == TraceReplayer(path).prepare(client)
+        keys = [record.keys for record in read_trace(path)]
+        assert "x" * 5 == client.values[keys[0][0]]
+        assert "x" * 4 == client.values[keys[1][1]]
+        assert keys[2][0] not in client.values
+
+    def test_set_size_in_bytes(self, tmp_path):
+        """
+        Test that the size of a set value is recorded in bytes.
+        """
+        path = str(tmp_path / "trace")
+        recorder = TraceRecorder(path)
+
+        class NullClient:
+            def set(self, key, value, timeout=None):
+                return True
+
+        RecordingClient(NullClient(), recorder).set("k", "\u00e4\u00e4")
+        recorder.close()
+        assert 4 == next(read_trace(path)).value_size
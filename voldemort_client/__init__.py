@@ -14,4 +14,5 @@
 """
 This is the root module definition file of the voldemort-client project.
 """
-__all__ = ["client"]
+__all__ = ["bloom", "cache", "client", "expiry", "handoff", "readonly",
+           "refresh", "retry", "scheduler", "trace"]
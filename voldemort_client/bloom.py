@@ -0,0 +1,230 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+This module contains the negative lookup filter. The filter holds the keys of
+a store in a bloom filter, so the client knows locally that a key doesn't
+exist and can skip the request.
+
+A bloom filter can answer "maybe present" for an absent key but never "absent"
+for a present key it knows. So the filter must be seeded with all keys of the
+store, for example after a bulk load, and the set calls of the client add new
+keys. A bloom filter can't remove a key, so deleted keys stay "maybe present"
+until the next seed. Keys which other clients write are not known, so the
+filter is only used for max_age seconds after it was seeded.
+"""
+import hashlib
+import math
+import struct
+import threading
+import time
+
+
+class BloomFilter:
+    """This class represents a bloom filter with one bit per position."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        capacity : int
+            the expected number of keys
+        error_rate : float
+            the expected rate of false positives at the capacity
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid.
+        """
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("The bloom filter isn't correct initialised.")
+        self._size = max(8, int(math.ceil(-capacity * math.log(error_rate) /
+                                          math.log(2) ** 2)))
+        self._hashes = max(1, int(round(self._size / capacity * math.log(2))))
+        self._bits = bytearray((self._size + 7) // 8)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return all(self._bits[index >> 3] & (1 << (index & 7))
+                   for index in self._indexes(key))
+
+    @property
+    def memory(self):
+        """int: the size of the bit array in bytes"""
+        return len(self._bits)
+
+    @property
+    def error_rate(self):
+        """float: the estimated rate of false positives with the current number
+        of keys"""
+        return (1 - math.exp(-self._hashes * self._count / self._size)) ** self._hashes
+
+    def add(self, key):
+        """This method adds a key.
+
+        Parameters
+        ----------
+        key : str
+            the key to add
+        """
+        for index in self._indexes(key):
+            self._bits[index >> 3] |= 1 << (index & 7)
+        self._count = self._count + 1
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = struct.unpack("<QQ", digest)
+        return [(first + number * second) % self._size
+                for number in range(self._hashes)]
+
+
+class NegativeLookupFilter:
+    """This class represents the filter of the existing keys of one store which
+    the client uses to answer lookups of absent keys locally."""
+
+    def __init__(self, capacity=1000000, error_rate=0.01, max_age=300):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        capacity : int
+            the expected number of keys of the store
+        error_rate : float
+            the expected rate of false positives at the capacity
+        max_age : float
+            the seconds after the seed in which the filter is used, None to
+            use it until the next seed
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid.
+        """
+        if max_age is not None and max_age <= 0:
+            raise ValueError("The lookup filter isn't correct initialised.")
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._max_age = max_age
+        self._filter = BloomFilter(capacity, error_rate)
+        self._seeded_at = None
+        self._deleted = set()
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "absent": 0, "false_positives": 0}
+
+    @property
+    def active(self):
+        """bool: True if the filter is seeded and not older than max_age"""
+        if self._seeded_at is None:
+            return False
+        return self._max_age is None or time.monotonic() - self._seeded_at < self._max_age
+
+    def seed(self, keys):
+        """This method replaces the filter with all keys of the store.
+
+        Parameters
+        ----------
+        keys : iterable
+            all keys of the store
+        """
+        bloom = BloomFilter(self._capacity, self._error_rate)
+        for key in keys:
+            bloom.add(key)
+        with self._lock:
+            self._filter = bloom
+            self._deleted = set()
+            self._seeded_at = time.monotonic()
+
+    def might_contain(self, key):
+        """This method checks if a key may exist.
+
+        Parameters
+        ----------
+        key : str
+            the key to check
+
+        Returns
+        -------
+        bool
+            False if the key surely doesn't exist else True
+        """
+        if not self.active:
+            return True
+        self._stats["lookups"] += 1
+        if key in self._filter:
+            return True
+        self._stats["absent"] += 1
+        return False
+
+    def add(self, key):
+        """This method adds a key which was written. A key which the filter
+        already reports as maybe present is not added again.
+
+        Parameters
+        ----------
+        key : str
+            the key to add
+        """
+        with self._lock:
+            self._deleted.discard(key)
+            if key not in self._filter:
+                self._filter.add(key)
+
+    def remove(self, key):
+        """This method notes a key which was deleted. The key stays in the
+        filter until the next seed, but a later miss of it isn't counted as
+        false positive.
+
+        Parameters
+        ----------
+        key : str
+            the key which was deleted
+        """
+        with self._lock:
+            self._deleted.add(key)
+
+    def record_miss(self, key):
+        """This method counts a key which the filter reported as maybe present
+        but which the cluster didn't find. Keys which this client deleted are
+        not counted.
+
+        Parameters
+        ----------
+        key : str
+            the key which wasn't found
+        """
+        if self.active and key not in self._deleted:
+            self._stats["false_positives"] += 1
+
+    def stats(self):
+        """This method returns the accuracy and the memory of the filter.
+
+        Returns
+        -------
+        dict
+            the number of lookups, of local answers and of false positives, the
+            number of keys, the memory in bytes, the estimated and the observed
+            rate of absent keys which the filter didn't detect
+        """
+        result = dict(self._stats)
+        result["keys"] = len(self._filter)
+        result["memory"] = self._filter.memory
+        result["estimated_error_rate"] = self._filter.error_rate
+        absent = result["absent"] + result["false_positives"]
+        result["observed_error_rate"] = (result["false_positives"] / absent
+                                         if absent else 0.0)
+        return result
@@ -0,0 +1,337 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+This module contains the value cache which is shared between processes over a
+memory-mapped file. It is made for pre-fork servers where every worker process
+has its own client but all of them should use the same cached values.
+
+The file holds a fixed-size hash table. Every key is mapped to a bucket of
+some slots and every slot has the same size, so the values are stored in place
+and no allocator is needed. The readers don't lock: every slot has a sequence
+number which the writer makes odd while it changes the slot, a reader retries
+if the number was odd or changed while it copied the slot. The writers lock the
+file with flock. If a bucket is full the least recently read slot is reused.
+The module needs a POSIX system.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b"VOLDSHMC"
+HEADER = struct.Struct("<8sIII")
+HEADER_SIZE = 64
+SLOT_HEADER = struct.Struct("<IHHIIQQ")
+SEQUENCE = struct.Struct("<I")
+ACCESS = struct.Struct("<Q")
+ACCESS_OFFSET = 24
+USED = 1
+READ_TRIES = 16
+
+
+class SharedMemoryCache:
+    """This class represents a value cache in a memory-mapped file which can be
+    used by many processes at the same time."""
+
+    def __init__(self, path, slots=65536, slot_size=1024, ways=8, ttl=60):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        path : str
+            the path of the cache file, all processes must use the same path
+        slots : int
+            the number of slots in the hash table
+        slot_size : int
+            the size of one slot in bytes, bigger values aren't cached
+        ways : int
+            the number of slots in one bucket
+        ttl : int
+            the seconds a value is valid in the cache, 0 for no expiry
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid or the file has another layout.
+        """
+        if not _is_valid_layout(slots, slot_size, ways) or ttl < 0:
+            raise ValueError("The cache isn't correct initialised.")
+        self._path = path
+        self._slots = slots
+        self._slot_size = slot_size
+        self._ways = ways
+        self._buckets = slots // ways
+        self._ttl = ttl
+        self._pid = None
+        self._fd = None
+        self._map = None
+        self._open()
+
+    def get(self, key):
+        """This method returns the cached value of a key.
+
+        Parameters
+        ----------
+        key : bytes
+            the key to lookup
+
+        Returns
+        -------
+        bytes
+            the value or None if the key isn't cached
+        """
+        memory = self._memory()
+        key_hash = _hash(key)
+        now = time.time()
+        for offset in self._bucket(key_hash):
+            for _ in range(READ_TRIES):
+                before = SEQUENCE.unpack_from(memory, offset)[0]
+                if before & 1:
+                    continue
+                (_, key_len, flags, value_len, expires, slot_hash,
+                 _) = SLOT_HEADER.unpack_from(memory, offset)
+                if not flags & USED or slot_hash != key_hash or key_len != len(key):
+                    if SEQUENCE.unpack_from(memory, offset)[0] == before:
+                        break
+                    continue
+                start = offset + SLOT_HEADER.size
+                data = memory[start:start + key_len + value_len]
+                if SEQUENCE.unpack_from(memory, offset)[0] != before:
+                    continue
+                if data[:key_len] != key:
+                    break
+                if expires and expires <= now:
+                    return None
+                ACCESS.pack_into(memory, offset + ACCESS_OFFSET, _now_ms())
+                return data[key_len:]
+        return None
+
+    def set(self, key, value):
+        """This method stores a value in the cache. Values which don't fit in
+        one slot are not cached.
+
+        Parameters
+        ----------
+        key : bytes
+            the key of the value
+        value : bytes
+            the value to store
+
+        Returns
+        -------
+        bool
+            True if the value was cached else False
+        """
+        if SLOT_HEADER.size + len(key) + len(value) > self._slot_size:
+            self.delete(key)
+            return False
+        memory = self._memory()
+        key_hash = _hash(key)
+        expires = int(time.time()) + self._ttl if self._ttl else 0
+        with self._lock():
+            offset = self._find(memory, key, key_hash)
+            if offset is None:
+                offset = self._victim(memory, key_hash)
+            self._write(memory, offset, key, value, key_hash, expires)
+        return True
+
+    def delete(self, key):
+        """This method removes a key from the cache.
+
+        Parameters
+        ----------
+        key : bytes
+            the key to remove
+        """
+        memory = self._memory()
+        key_hash = _hash(key)
+        with self._lock():
+            offset = self._find(memory, key, key_hash)
+            if offset is not None:
+                _erase(memory, offset)
+
+    def clear(self):
+        """This method removes all keys from the cache."""
+        memory = self._memory()
+        with self._lock():
+            for index in range(self._slots):
+                _erase(memory, HEADER_SIZE + index * self._slot_size)
+
+    def close(self):
+        """This method unmaps the cache file of this process."""
+        if self._map is not None and self._pid == os.getpid():
+            self._map.close()
+            os.close(self._fd)
+        self._map = None
+        self._fd = None
+        self._pid = None
+
+    def _open(self):
+        """This method opens and maps the cache file and creates it if it
+        doesn't exist."""
+        size = HEADER_SIZE + self._slots * self._slot_size
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                header = os.pread(fd, HEADER.size, 0)
+                if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, HEADER.pack(MAGIC, self._slots, self._slot_size,
+                                              self._ways), 0)
+                elif HEADER.unpack(header)[1:] != (self._slots, self._slot_size,
+                                                   self._ways):
+                    raise ValueError("The cache file has another layout.")
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(fd, size, mmap.MAP_SHARED,
+                                  mmap.PROT_READ | mmap.PROT_WRITE)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._pid = os.getpid()
+
+    def _memory(self):
+        """This method returns the mapped file and maps it again after a fork,
+        because the file lock is bound to the file descriptor."""
+        if self._pid != os.getpid():
+            self._map = None
+            self._fd = None
+            self._open()
+        return self._map
+
+    def _lock(self):
+        return _FileLock(self._fd)
+
+    def _bucket(self, key_hash):
+        first = (key_hash % self._buckets) * self._ways
+        return [HEADER_SIZE + (first + way) * self._slot_size
+                for way in range(self._ways)]
+
+    def _find(self, memory, key, key_hash):
+        for offset in self._bucket(key_hash):
+            (_, key_len, flags, _, _, slot_hash,
+             _) = SLOT_HEADER.unpack_from(memory, offset)
+            start = offset + SLOT_HEADER.size
+            if (flags & USED and slot_hash == key_hash and key_len == len(key)
+                    and memory[start:start + key_len] == key):
+                return offset
+        return None
+
+    def _victim(self, memory, key_hash):
+        victim = None
+        oldest = None
+        now = time.time()
+        for offset in self._bucket(key_hash):
+            (_, _, flags, _, expires, _,
+             access) = SLOT_HEADER.unpack_from(memory, offset)
+            if not flags & USED or (expires and expires <= now):
+                return offset
+            if oldest is None or access < oldest:
+                victim = offset
+                oldest = access
+        return victim
+
+    def _write(self, memory, offset, key, value, key_hash, expires):
+        sequence = _begin_write(memory, offset)
+        start = offset + SLOT_HEADER.size
+        memory[start:start + len(key) + len(value)] = key + value
+        SLOT_HEADER.pack_into(memory, offset, sequence, len(key), USED,
+                              len(value), expires, key_hash, _now_ms())
+        _end_write(memory, offset, sequence)
+
+
+class _FileLock:
+    """This class is the context manager of the writer lock."""
+
+    def __init__(self, fd):
+        self._fd = fd
+
+    def __enter__(self):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+def _begin_write(memory, offset):
+    """This method makes the sequence number of a slot odd, so the readers
+    know that the slot changes. The lock of the writers must be held.
+
+    Parameters
+    ----------
+    memory : mmap.mmap
+        the mapped cache file
+    offset : int
+        the offset of the slot
+
+    Returns
+    -------
+    int
+        the odd sequence number
+    """
+    sequence = SEQUENCE.unpack_from(memory, offset)[0]
+    sequence = (sequence + (2 if sequence & 1 else 1)) & 0xFFFFFFFF
+    SEQUENCE.pack_into(memory, offset, sequence)
+    return sequence
+
+
+def _end_write(memory, offset, sequence):
+    """This method makes the sequence number of a slot even again."""
+    SEQUENCE.pack_into(memory, offset, (sequence + 1) & 0xFFFFFFFF)
+
+
+def _erase(memory, offset):
+    """This method marks a slot as unused."""
+    sequence = _begin_write(memory, offset)
+    memory[offset + SEQUENCE.size:offset + SLOT_HEADER.size] = bytes(
+        SLOT_HEADER.size - SEQUENCE.size)
+    _end_write(memory, offset, sequence)
+
+
+def _hash(key):
+    """This method returns the hash of a key which is the same in every
+    process."""
+    return struct.unpack("<Q", hashlib.blake2b(key, digest_size=8).digest())[0]
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _is_valid_layout(slots, slot_size, ways):
+    """This method validates the layout of the hash table.
+
+    Parameters
+    ----------
+    slots : int
+        the number of slots
+    slot_size : int
+        the size of one slot
+    ways : int
+        the number of slots per bucket
+
+    Returns
+    -------
+    bool
+        True if valid else False
+    """
+    return (isinstance(slots, int) and isinstance(slot_size, int) and
+            isinstance(ways, int) and ways > 0 and slots >= ways and
+            slots % ways == 0 and slot_size > SLOT_HEADER.size)
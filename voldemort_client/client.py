@@ -15,26 +15,462 @@
 This is the entry module of the project. It contains the base class and some
 helper methods.
 """
+import copy
 import email
 import logging
 import re
+import time
+from xml.etree import ElementTree
 import requests
-from requests.exceptions import ConnectionError, HTTPError, Timeout
+from requests.exceptions import ConnectionError, Timeout
 import simplejson as json
 from voldemort_client import helper
-from voldemort_client.exception import VoldemortError, RestError
+from voldemort_client.expiry import ExpiryIndex, ExpirySweeper
+from voldemort_client.handoff import HandoffReplayer
+from voldemort_client.retry import (CONFLICT, FATAL, NOT_FOUND, RETRY, SUCCESS,
+                                    RetryPolicy, full_jitter, is_unsent)
+from voldemort_client.scheduler import INTERACTIVE
+from voldemort_client.exception import (VoldemortError, RestError,
+                                        ObsoleteVersionError, UnknownWriteError)
+
+LATENCY_WEIGHT = 0.2
+
+class VoldemortCluster:
+    """This class represents the connection to one voldemort cluster. It owns
+    the transport, the state of the nodes and the cluster metadata and hands out
+    lightweight store handles which share all of them."""
+
+    def __init__(self, servers, connection_timeout=3000, debug=False,
+                 retry_interval=30, cache=None, scheduler=None, local_zone=None,
+                 zone_latency_ratio=0.5, handoff=None, retry_policy=None,
+                 zone_probe_interval=30):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        servers : list
+            the list of server tuples (url, node_id) or (url, node_id, zone_id)
+        connection_timeout : int
+            the timeout of the http connection in milli seconds
+        debug : bool
+            if true print more logging messages
+        retry_interval : int
+            the seconds a failed node is moved to the end of the server list
+        cache : SharedMemoryCache
+            the cache which is asked before the values are fetched from the
+            cluster, see :py:mod:`voldemort_client.cache`
+        scheduler : RequestScheduler
+            the scheduler which orders the requests by their priority class,
+            see :py:mod:`voldemort_client.scheduler`
+        local_zone : int
+            the zone of the client, reads prefer the nodes of this zone
+        zone_latency_ratio : float
+            a node of another zone is read first if its average latency is
+            below this part of the best latency of the local zone
+        handoff : HintedHandoffQueue
+            the queue of the writes which failed on every node, see
+            :py:mod:`voldemort_client.handoff`
+        retry_policy : RetryPolicy
+            the retry policy of all requests, None for the default policy, see
+            :py:mod:`voldemort_client.retry`
+        zone_probe_interval : float
+            the seconds after which one read is sent first to a node of another
+            zone to measure its latency, None to never probe, the latency of a
+            node of another zone is only used for two intervals
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid.
+        """
+        if not _is_valid_cluster(servers, debug, connection_timeout):
+            raise ValueError("The cluster isn't correct initialised.")
+
+        self._servers = servers
+        self._connection_timeout = connection_timeout
+        self._debug = debug
+        self._retry_interval = retry_interval
+        self._session = requests.Session()
+        self._failures = {}
+        self._cache = cache
+        self._expiry = {}
+        self._lookup_filters = {}
+        self._update_stats = {}
+        self._sweeper = None
+        self._scheduler = scheduler
+        self._local_zone = local_zone
+        self._zone_latency_ratio = zone_latency_ratio
+        self._latencies = {}
+        self._measured = {}
+        self._zone_probe_interval = zone_probe_interval
+        self._probed = dict.fromkeys((server[1] for server in servers),
+                                     time.monotonic())
+        self._handoff = handoff
+        self._replayer = None
+        self._retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+
+    @classmethod
+    def from_cluster_xml(cls, path, scheme="http", **kwargs):
+        """This method creates a cluster from the cluster.xml of a voldemort
+        cluster. The url of every node is built from the host and the rest-port
+        and the zone is taken from the zone-id.
+
+        Parameters
+        ----------
+        path : str
+            the path of the cluster.xml
+        scheme : str
+            the scheme of the urls
+        kwargs : dict
+            the further arguments of the constructor
+
+        Returns
+        -------
+        VoldemortCluster
+            the cluster of the nodes
+
+        Raises
+        ------
+        ValueError
+            If a node has no rest-port or the parameters are not valid.
+        """
+        return cls(_parse_cluster_xml(path, scheme), **kwargs)
+
+    @property
+    def connection_timeout(self):
+        """int: the timeout of the http connection in milli seconds"""
+        return self._connection_timeout
+
+    @property
+    def cache(self):
+        """SharedMemoryCache: the value cache of the cluster or None"""
+        return self._cache
+
+    @property
+    def scheduler(self):
+        """RequestScheduler: the request scheduler of the cluster or None"""
+        return self._scheduler
+
+    @property
+    def handoff(self):
+        """HintedHandoffQueue: the queue of the failed writes or None"""
+        return self._handoff
+
+    @property
+    def retry_policy(self):
+        """RetryPolicy: the retry policy of all requests"""
+        return self._retry_policy
+
+    @property
+    def debug(self):
+        """bool: the flag if more logging messages should be printed"""
+        return self._debug
+
+    def store(self, store_name, max_length=(None, None), priority=INTERACTIVE):
+        """This method returns a handle for one store of the cluster.
+
+        Parameters
+        ----------
+        store_name : str
+            the name of the used store
+        max_length : tuple
+            the tuple of the key and value langth
+        priority : str
+            the priority class of the requests of the handle
+
+        Returns
+        -------
+        VoldemortClient
+            the client of the store which shares the cluster resources
+        """
+        return VoldemortClient(None, store_name, max_length=max_length,
+                               cluster=self, priority=priority)
+
+    def expiry(self, store_name):
+        """This method returns the index of the keys with an expire time of one
+        store.
+
+        Parameters
+        ----------
+        store_name : str
+            the name of the store
+
+        Returns
+        -------
+        ExpiryIndex
+            the expiry index of the store
+        """
+        return self._expiry.setdefault(store_name, ExpiryIndex())
+
+    def lookup_filter(self, store_name):
+        """This method returns the negative lookup filter of one store.
+
+        Parameters
+        ----------
+        store_name : str
+            the name of the store
+
+        Returns
+        -------
+        NegativeLookupFilter
+            the filter of the store or None
+        """
+        return self._lookup_filters.get(store_name)
+
+    def set_lookup_filter(self, store_name, lookup_filter):
+        """This method sets the negative lookup filter of one store, see
+        :py:mod:`voldemort_client.bloom`.
+
+        Parameters
+        ----------
+        store_name : str
+            the name of the store
+        lookup_filter : NegativeLookupFilter
+            the filter of the store or None to remove it
+        """
+        if lookup_filter is None:
+            self._lookup_filters.pop(store_name, None)
+        else:
+            self._lookup_filters[store_name] = lookup_filter
+
+    def update_stats(self, store_name):
+        """This method returns the counters of the update method of one store,
+        which all handles of the store share.
+
+        Parameters
+        ----------
+        store_name : str
+            the name of the store
+
+        Returns
+        -------
+        dict
+            the counters of the store
+        """
+        stats = self._update_stats.get(store_name)
+        if stats is None:
+            stats = self._update_stats.setdefault(
+                store_name, {"attempts": 0, "conflicts": 0, "failures": 0,
+                             "exhausted": 0})
+        return stats
+
+    def expiry_indexes(self):
+        """This method returns the expiry indexes of all stores.
+
+        Returns
+        -------
+        list
+            the list of tuples (store_name, index)
+        """
+        return list(self._expiry.items())
+
+    def start_expiry_sweeper(self, interval=1.0, batch_size=100):
+        """This method starts the background thread which deletes the expired
+        keys of all stores in batches.
+
+        Parameters
+        ----------
+        interval : float
+            the pause between two batches in seconds
+        batch_size : int
+            the maximal number of deletes per batch
+
+        Returns
+        -------
+        ExpirySweeper
+            the started thread
+        """
+        if self._sweeper is None:
+            self._sweeper = ExpirySweeper(self, interval, batch_size)
+            self._sweeper.start()
+        return self._sweeper
+
+    def start_handoff_replayer(self, interval=1.0, rate=50):
+        """This method starts the background thread which sends the writes of
+        the hinted handoff queue again.
+
+        Parameters
+        ----------
+        interval : float
+            the pause between two rounds in seconds
+        rate : int
+            the maximal number of writes per round
+
+        Returns
+        -------
+        HandoffReplayer
+            the started thread
+
+        Raises
+        ------
+        VoldemortError
+            If the cluster has no handoff queue.
+        """
+        if self._handoff is None:
+            raise VoldemortError("The cluster has no handoff queue.")
+        if self._replayer is None:
+            self._replayer = HandoffReplayer(self, self._handoff, interval, rate)
+            self._replayer.start()
+        return self._replayer
+
+    def nodes(self, read=False):
+        """This method returns the servers in the order they should be asked.
+        Nodes which failed in the last retry interval are moved to the end. For
+        reads the nodes of the local zone are asked before the other nodes,
+        except a node of another zone is much faster or its latency is probed.
+
+        Parameters
+        ----------
+        read : bool
+            if true order the nodes for a read request
+
+        Returns
+        -------
+        list
+            the list of server tuples (url, node_id[, zone_id])
+        """
+        now = time.monotonic()
+        healthy = []
+        failed = []
+        for server in self._servers:
+            failed_at = self._failures.get(server[1])
+            if failed_at is not None and now - failed_at < self._retry_interval:
+                failed.append(server)
+            else:
+                healthy.append(server)
+        if read and self._local_zone is not None:
+            healthy.sort(key=self._zone_rank(healthy, now))
+        return healthy + failed
+
+    def request(self, method, node_id, url, priority=INTERACTIVE, **kwargs):
+        """This method sends one http request over the shared connection pool
+        and keeps the state of the node up to date.
+
+        Parameters
+        ----------
+        method : str
+            the http method
+        node_id : int
+            the id of the node which gets the request
+        url : str
+            the url of the request
+        priority : str
+            the priority class of the request
+        kwargs : dict
+            the further arguments of the request
+
+        Returns
+        -------
+        requests.Response
+            the response of the node
+        """
+        try:
+            if self._scheduler is None:
+                started = time.monotonic()
+                response = self._session.request(method, url, **kwargs)
+            else:
+                with self._scheduler.slot(node_id, priority):
+                    started = time.monotonic()
+                    response = self._session.request(method, url, **kwargs)
+        except (ConnectionError, Timeout):
+            self._failures[node_id] = time.monotonic()
+            raise
+        self._failures.pop(node_id, None)
+        latency = time.monotonic() - started
+        average = self._latencies.get(node_id)
+        if average is None:
+            self._latencies[node_id] = latency
+        else:
+            self._latencies[node_id] = average + LATENCY_WEIGHT * (latency - average)
+        self._measured[node_id] = time.monotonic()
+        return response
+
+    def latency(self, node_id):
+        """This method returns the average latency of a node.
+
+        Parameters
+        ----------
+        node_id : int
+            the id of the node
+
+        Returns
+        -------
+        float
+            the moving average of the latency in seconds or None
+        """
+        return self._latencies.get(node_id)
+
+    def close(self):
+        """This method stops the background threads and closes all open
+        connections of the cluster."""
+        if self._sweeper is not None:
+            self._sweeper.stop()
+            self._sweeper = None
+        if self._replayer is not None:
+            self._replayer.stop()
+            self._replayer = None
+        if self._handoff is not None:
+            self._handoff.close()
+        self._session.close()
+
+    def _zone_rank(self, servers, now):
+        """This method returns the sort key of the nodes for reads. A probed
+        node and the nodes of other zones which are faster than the local zone
+        come first, then the nodes of the local zone and then all other
+        nodes."""
+        local = [self._latencies[server[1]] for server in servers
+                 if _zone(server) == self._local_zone and server[1] in self._latencies]
+        best_local = min(local) if local else None
+        probe = self._probe(servers, now)
+
+        def rank(server):
+            if server[1] == probe:
+                return 0
+            if _zone(server) == self._local_zone:
+                return 1
+            latency = None
+            if (self._zone_probe_interval is None or
+                    now - self._measured.get(server[1], now) < 2 * self._zone_probe_interval):
+                latency = self._latencies.get(server[1])
+            if (best_local is not None and latency is not None and
+                    latency < best_local * self._zone_latency_ratio):
+                return 0
+            return 2
+        return rank
+
+    def _probe(self, servers, now):
+        """This method returns the node of another zone whose latency wasn't
+        measured for the probe interval or None. The node is marked as probed,
+        so only one read is sent to it per interval."""
+        if self._zone_probe_interval is None:
+            return None
+        for server in servers:
+            node_id = server[1]
+            if _zone(server) == self._local_zone:
+                continue
+            last = max(self._probed.get(node_id, now), self._measured.get(node_id, 0))
+            if now - last >= self._zone_probe_interval:
+                self._probed[node_id] = now
+                return node_id
+        return None
+
+    def _log(self, msg):
+        if self._debug:
+            logging.debug(msg)
+
 
 class VoldemortClient:
     """This class represents the REST-Client to the voldermort cluster."""
 
     def __init__(self, servers, store_name, connection_timeout=3000, debug=False,
-                 max_length=(None, None)):
+                 max_length=(None, None), cluster=None, priority=INTERACTIVE):
         """This is the constructor method of the class.
 
         Parameters
         ----------
         servers : list
-            the list of server tuples (url, node_id)
+            the list of server tuples (url, node_id), ignored if a cluster is
+            given
         store_name : str
             the name of the used store
         connection_timeout : int
@@ -43,22 +479,50 @@ class VoldemortClient:
             if true print more logging messages
         max_length : tuple
             the tuple of the key and value langth
+        cluster : VoldemortCluster
+            the shared cluster, if None the client creates its own
+        priority : str
+            the priority class of the requests of the client
 
         Raises
         ------
         ValueError
             If the input parameters not valid.
         """
-        if not _is_valid(servers, store_name, debug, connection_timeout):
+        if cluster is None:
+            if not _is_valid(servers, store_name, debug, connection_timeout):
+                raise ValueError("The class isn't correct initialised.")
+            cluster = VoldemortCluster(servers, connection_timeout, debug)
+        elif not _is_valid_store_name(store_name):
             raise ValueError("The class isn't correct initialised.")
 
-        self._servers = servers
+        self._cluster = cluster
         self._store_name = store_name
-        self._connection_timeout = connection_timeout
-        self._debug = debug
         self._max_length = max_length
-        self._server_length = len(self._servers)
+        self._priority = priority
         self._keys = []
+        self._update_stats = cluster.update_stats(store_name)
+
+    @property
+    def cluster(self):
+        """VoldemortCluster: the cluster which the client uses"""
+        return self._cluster
+
+    def with_priority(self, priority):
+        """This method returns a handle for the same store whose requests have
+        another priority class.
+
+        Parameters
+        ----------
+        priority : str
+            the priority class, for example "batch"
+
+        Returns
+        -------
+        VoldemortClient
+            the client of the store with the priority class
+        """
+        return self._cluster.store(self._store_name, self._max_length, priority)
 
     def add(self, key, value, timeout=None):
         """This method adds on key-value pair on the server but only if the key
@@ -103,15 +567,22 @@ class VoldemortClient:
         str
             the value of the key or None
         """
-        headers = helper.build_get_headers(self._connection_timeout)
+        if self._cluster.expiry(self._store_name).is_expired(key):
+            return None
+        lookup_filter = self._cluster.lookup_filter(self._store_name)
+        if lookup_filter is not None and not lookup_filter.might_contain(key):
+            return None
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        headers = helper.build_get_headers(self._cluster.connection_timeout)
         content = self._get(key, headers)
         if content:
-            message_str = content.decode()
-            lines = message_str.split("\r\n")
-            message_lines = lines[1:-2]
-            msg = '\r\n'.join(message_lines)
-            message = email.message_from_string(msg)
-            return message.get_payload()
+            value = self._extract_message(content).get_payload()
+            self._cache_value(key, value)
+            return value
+        if lookup_filter is not None:
+            lookup_filter.record_miss(key)
 
     def get_many(self, keys):
         """This method returns the values from the key list.
@@ -126,19 +597,44 @@ class VoldemortClient:
         dict
             the founded key-value-pairs or None
         """
-        headers = helper.build_get_headers(self._connection_timeout)
-        content = self._get(','.join(keys), headers)
-        if content:
+        result = {}
+        missing = []
+        index = self._cluster.expiry(self._store_name)
+        lookup_filter = self._cluster.lookup_filter(self._store_name)
+        for key in keys:
+            if index.is_expired(key):
+                continue
+            if lookup_filter is not None and not lookup_filter.might_contain(key):
+                continue
+            cached = self._cached(key)
+            if cached is None:
+                missing.append(key)
+            else:
+                result[key] = cached
+        if not missing:
+            return result if result else None
+        headers = helper.build_get_headers(self._cluster.connection_timeout)
+        content = self._get(','.join(missing), headers)
+        if content and len(missing) == 1:
+            value = self._extract_message(content).get_payload()
+            result[missing[0]] = value
+            self._cache_value(missing[0], value)
+        elif content:
             messages = self._extract_messages(content)
             sub_messages = [(msg.get("Content-Location"), msg.get_payload()[0])
                             for msg in messages]
             result_list = [(sub_message[0].rsplit("/")[2], sub_message[1].get_payload())
                            for sub_message in sub_messages]
-            result = {}
             for location, value in result_list:
-                for key in keys:
+                for key in missing:
                     if key.startswith(location):
                         result[key] = value
+                        self._cache_value(key, value)
+        if lookup_filter is not None:
+            for key in missing:
+                if key not in result:
+                    lookup_filter.record_miss(key)
+        if content or result:
             return result
 
     def get_version(self, key):
@@ -154,11 +650,34 @@ class VoldemortClient:
         dict
             the version as dict
         """
-        headers = helper.build_version_headers(self._connection_timeout)
+        headers = helper.build_version_headers(self._cluster.connection_timeout)
         content = self._get(key, headers)
         if content:
             return json.loads(content)[0]
 
+    def get_versioned(self, key):
+        """This method fetches the value and the vector clock of a key with one
+        request. The cache is not asked, so the value always belongs to the
+        returned vector clock.
+
+        Parameters
+        ----------
+        key : str
+            the key to fetch
+
+        Returns
+        -------
+        tuple
+            the value and the vector clock or (None, None)
+        """
+        headers = helper.build_get_headers(self._cluster.connection_timeout)
+        content = self._get(key, headers)
+        if content:
+            message = self._extract_message(content)
+            clock = message.get("X-VOLD-Vector-Clock")
+            return message.get_payload(), json.loads(clock) if clock else None
+        return None, None
+
     def set(self, key, value, timeout=None):
         """This method sets the value on the server.
 
@@ -169,48 +688,101 @@ class VoldemortClient:
         value : str
             the value to store
         timeout : int
-            the expire time as timestamp
+            the expire time as timestamp in milli seconds
 
         Returns
         -------
         bool
             True if success else False
+
+        Raises
+        ------
+        RestError
+            If the cluster isn't reachable or the write may have been applied
+            and the cluster has no hinted handoff queue.
         """
         if isinstance(key, str):
-            server = ""
-            retries = 0
-            response = None
-            clock = None
-            while retries < self._server_length and response is None:
-                try:
-                    server = self._servers[retries][0]
-                    node_id = self._servers[retries][1]
-                    vector_clock = self.get_version(key)
-                    if vector_clock is None:
-                        clock = helper.create_vector_clock(node_id, timeout)
-                    else:
-                        clock = helper.merge_vector_clock(vector_clock, node_id,
-                                                          timeout)
-                    headers = helper.build_set_headers(self._connection_timeout,
-                                                       clock)
-                    response = requests.post(helper.build_url(server,
-                                                              self._store_name,
-                                                              key),
-                                             headers=headers, data=value)
-                    response.raise_for_status()
+            vector_clock = None
+            try:
+                vector_clock = self.get_version(key)
+                category = self._put(key, value, vector_clock, timeout)
+                if category == SUCCESS:
                     return True
-                except (ConnectionError, HTTPError, Timeout) as error:
-                    if (retries + 1) < self._server_length:
-                        self._log("The value couldn't be set on server %s." % server)
-                        retries = retries + 1
-                        response = None
-                    else:
-                        self._log("The value couldn't be set.")
-                        self._log(error.strerror)
-                        return False
+                if category != RETRY:
+                    return False
+            except ObsoleteVersionError:
+                self._log("The value couldn't be set, the version is obsolete.")
+                return False
+            except RestError:
+                if self._cluster.handoff is None:
+                    raise
+            self._hand_off("set", key, value, vector_clock, timeout)
+            return False
         else:
             raise VoldemortError("The key isn't a string.")
 
+    def update(self, key, function, max_attempts=5, timeout=None,
+               backoff=0.01, max_backoff=1.0):
+        """This method changes the value of a key with a function. The value and
+        the version are fetched with one request and the new value is only put
+        if the version on the cluster is still the same. If another writer was
+        faster the update is retried with the new value after a random pause.
+
+        Parameters
+        ----------
+        key : str
+            the key which should be updated
+        function : callable
+            the function which gets the current value or None and returns the
+            new value
+        max_attempts : int
+            the maximal number of tries
+        timeout : int
+            the expire time as timestamp in milli seconds
+        backoff : float
+            the maximal pause after the first conflict in seconds, it doubles
+            with every conflict
+        max_backoff : float
+            the upper limit of the pause in seconds
+
+        Returns
+        -------
+        bool
+            True if success else False
+
+        Raises
+        ------
+        UnknownWriteError
+            If the connection failed after the new value was sent, the function
+            isn't applied again because the first write may have been applied.
+        """
+        if isinstance(key, str):
+            for attempt in range(max_attempts):
+                self._update_stats["attempts"] += 1
+                value, vector_clock = self.get_versioned(key)
+                try:
+                    if self._put(key, function(value), vector_clock,
+                                 timeout) == SUCCESS:
+                        return True
+                    self._update_stats["failures"] += 1
+                    return False
+                except ObsoleteVersionError:
+                    self._update_stats["conflicts"] += 1
+                    self._log("The update of %s had a conflict." % key)
+                    if (attempt + 1) < max_attempts:
+                        time.sleep(full_jitter(attempt, backoff, max_backoff))
+            self._update_stats["exhausted"] += 1
+            return False
+        else:
+            raise VoldemortError("The key isn't a string.")
+
+    @property
+    def update_stats(self):
+        """dict: the counters of the update method of all handles of the store,
+        the attempts, the conflicts with other writers, the failed requests and
+        the updates which reached the maximal number of tries"""
+        return dict(self._update_stats)
+
     def delete(self, key):
         """This method deletes an existing value.
 
@@ -225,37 +797,211 @@ class VoldemortClient:
             True if success else False
         """
         if isinstance(key, str):
-            server = ""
-            retries = 0
-            response = None
-            vector_clock = self.get_version(key)
+            try:
+                vector_clock = self.get_version(key)
+            except RestError:
+                if self._cluster.handoff is None:
+                    raise
+                self._hand_off("delete", key)
+                return False
             if vector_clock is not None:
-                while retries < self._server_length and response is None:
-                    try:
-                        server = self._servers[retries][0]
-                        node_id = self._servers[retries][1]
-                        clock = helper.merge_vector_clock(vector_clock, node_id)
-                        headers = helper.build_delete_headers(self._connection_timeout,
-                                                              clock)
-                        response = requests.delete(helper.build_url(server,
-                                                                    self._store_name,
-                                                                    key),
-                                                   headers=headers)
-                        response.raise_for_status()
-                        self._keys.remove(key)
-                        return True
-                    except (ConnectionError, HTTPError, Timeout) as error:
-                        if (retries + 1) < self._server_length:
-                            self._log("The value couldn't be deleted on %s." % server)
-                            retries = retries + 1
-                            response = None
-                        else:
-                            self._log("The value couldn't be deleted.")
-                            self._log(error.strerror)
-                            return False
+                category = self._delete(key, vector_clock)
+                if category == SUCCESS:
+                    return True
+                if category != RETRY:
+                    return False
+                self._hand_off("delete", key, vector_clock=vector_clock)
+                return False
         else:
             raise VoldemortError("The key isn't a string.")
 
+    def expire(self, key, expires):
+        """This method deletes a key whose expire time is reached. The key is
+        kept if it was written again before its version was fetched. A write
+        which runs at the same time as the delete isn't protected: if it goes
+        through the same node its version equals the version of the delete, so
+        the delete removes it too. The REST api has no conditional delete
+        which could prevent this.
+
+        Parameters
+        ----------
+        key : str
+            the due key
+        expires : int
+            the expire time which the expiry index returned
+
+        Returns
+        -------
+        bool
+            True if the key is deleted or doesn't exist, False if it was
+            written again or couldn't be deleted
+
+        Raises
+        ------
+        RestError
+            If the cluster isn't reachable.
+        """
+        index = self._cluster.expiry(self._store_name)
+        vector_clock = self.get_version(key)
+        if not index.is_sweeping(key, expires):
+            return False
+        if vector_clock is not None and self._delete(key, vector_clock) != SUCCESS:
+            return False
+        index.done(key, expires)
+        return True
+
+    def replay_write(self, operation, key, value=None, vector_clock=None,
+                     timeout=None):
+        """This method sends a write of the hinted handoff queue again. A set
+        with a version is only applied if the key wasn't changed in the
+        meantime.
+
+        Parameters
+        ----------
+        operation : str
+            "set" or "delete"
+        key : str
+            the key of the write
+        value : str
+            the value of a set
+        vector_clock : dict
+            the version the write was based on or None for the current version
+        timeout : int
+            the expire time as timestamp in milli seconds
+
+        Returns
+        -------
+        bool
+            True if the write is done, obsolete or rejected by the cluster,
+            False if the cluster is still not reachable
+        """
+        try:
+            if operation == "set":
+                if vector_clock is None:
+                    vector_clock = self.get_version(key)
+                category = self._put(key, value, vector_clock, timeout)
+            else:
+                current = self.get_version(key)
+                if current is None:
+                    return True
+                category = self._delete(key, current)
+        except ObsoleteVersionError:
+            self._log("The handed off write of %s is obsolete." % key)
+            return True
+        except RestError:
+            return False
+        except VoldemortError as error:
+            logging.warning("The handed off %s of %s is dropped: %s", operation,
+                            key, error)
+            return True
+        if category == FATAL:
+            logging.warning("The handed off %s of %s is dropped, the cluster "
+                            "rejected it.", operation, key)
+        return category != RETRY
+
+    def _delete(self, key, vector_clock):
+        """This method deletes a version of a key.
+
+        Parameters
+        ----------
+        key : str
+            the key to delete
+        vector_clock : dict
+            the current version of the key
+
+        Returns
+        -------
+        str
+            the category of the last attempt
+        """
+        def build_headers(node_id):
+            clock = helper.merge_vector_clock(copy.deepcopy(vector_clock), node_id)
+            return helper.build_delete_headers(self._cluster.connection_timeout,
+                                               clock)
+
+        category, _, error = self._send("DELETE", key, build_headers)
+        if category == SUCCESS:
+            self._invalidate(key)
+            self._cluster.expiry(self._store_name).remove(key)
+            lookup_filter = self._cluster.lookup_filter(self._store_name)
+            if lookup_filter is not None:
+                lookup_filter.remove(key)
+            self._handed_over(key)
+            if key in self._keys:
+                self._keys.remove(key)
+            return category
+        self._log("The value couldn't be deleted.")
+        if error is not None:
+            self._log(str(error))
+        return category
+
+    def _put(self, key, value, vector_clock, timeout=None):
+        """This method puts a value with a version which is derived from the
+        given vector clock.
+
+        Parameters
+        ----------
+        key : str
+            the key under which the value should be store
+        value : str
+            the value to store
+        vector_clock : dict
+            the current version of the key or None for a new key
+        timeout : int
+            the expire time as timestamp in milli seconds
+
+        Returns
+        -------
+        str
+            the category of the last attempt
+
+        Raises
+        ------
+        ObsoleteVersionError
+            If the cluster has a newer version of the key.
+        UnknownWriteError
+            If the connection failed after the value was sent.
+        """
+        def build_headers(node_id):
+            if vector_clock is None:
+                clock = helper.create_vector_clock(
+                    node_id, timeout if timeout is not None else _now_ms())
+            else:
+                clock = helper.merge_vector_clock(copy.deepcopy(vector_clock),
+                                                  node_id, timeout)
+            return helper.build_set_headers(self._cluster.connection_timeout, clock)
+
+        category, _, error = self._send("POST", key, build_headers,
+                                        idempotent=False, data=value)
+        if category == CONFLICT:
+            raise ObsoleteVersionError("The version of the key is obsolete.")
+        if category == RETRY and error is not None and not is_unsent(error):
+            raise UnknownWriteError("The value was sent but the connection failed.")
+        if category == SUCCESS:
+            self._invalidate(key)
+            self._handed_over(key)
+            lookup_filter = self._cluster.lookup_filter(self._store_name)
+            if lookup_filter is not None:
+                lookup_filter.add(key)
+            if timeout is None:
+                self._cluster.expiry(self._store_name).remove(key)
+            else:
+                self._cluster.expiry(self._store_name).add(key, timeout)
+            return category
+        self._log("The value couldn't be set.")
+        if error is not None:
+            self._log(str(error))
+        return category
+
+    def _extract_message(self, response_content):
+        """This method parses the response of a get request with one value.
+        """
+        message_str = response_content.decode()
+        lines = message_str.split("\r\n")
+        message_lines = lines[1:-2]
+        msg = '\r\n'.join(message_lines)
+        return email.message_from_string(msg)
+
     def _extract_messages(self, response_content):
         """
         """
@@ -293,36 +1039,152 @@ class VoldemortClient:
         """
         """
         if isinstance(key, str):
-            server = ""
-            retries = 0
-            response = None
-            while retries < self._server_length and response is None:
-                try:
-                    server = self._servers[retries][0]
-                    response = requests.get(helper.build_url(server,
-                                                             self._store_name, key),
-                                            headers=headers)
-                    response.raise_for_status()
-                    return response.content
-                except (ConnectionError, HTTPError, Timeout) as error:
-                    if (retries + 1) < self._server_length:
-                        self._log("Couldn't execute the get request on the server: %s." % server)
-                        retries = retries + 1
-                        response = None
-                    else:
-                        if isinstance(error, (ConnectionError, Timeout)):
-                            raise RestError("No connection couldn't established.")
-                        elif isinstance(error, HTTPError) and response.status_code == 404:
-                            return []
-                        else:
-                            raise VoldemortError("An unknown exception occured.")
+            category, response, error = self._send("GET", key,
+                                                    lambda node_id: headers,
+                                                    read=True)
+            if category == SUCCESS:
+                return response.content
+            elif category == NOT_FOUND:
+                return []
+            elif error is not None:
+                raise RestError("No connection couldn't established.")
+            else:
+                raise VoldemortError("An unknown exception occured.")
         else:
             raise VoldemortError("The key isn't a string.")
 
+    def _send(self, method, key, build_headers, read=False, idempotent=True,
+              data=None):
+        """This method sends one request with the retry policy of the cluster.
+        Every retry goes to the next node after a random pause.
+
+        Parameters
+        ----------
+        method : str
+            the http method
+        key : str
+            the url part which represents the key or keys
+        build_headers : callable
+            the function which builds the headers for a node id
+        read : bool
+            if true order the nodes for a read request
+        idempotent : bool
+            if false an attempt which may have reached a node isn't retried
+        data : str
+            the body of the request
+
+        Returns
+        -------
+        tuple
+            the category of the last attempt, the response or None and the
+            connection error or None
+        """
+        policy = self._cluster.retry_policy
+        servers = self._cluster.nodes(read=read)
+        policy.start()
+        attempt = 0
+        while True:
+            server = servers[attempt % len(servers)][0]
+            node_id = servers[attempt % len(servers)][1]
+            response = None
+            error = None
+            try:
+                response = self._cluster.request(method, node_id,
+                                                 helper.build_url(server,
+                                                                  self._store_name,
+                                                                  key),
+                                                 priority=self._priority,
+                                                 headers=build_headers(node_id),
+                                                 data=data)
+            except (ConnectionError, Timeout) as request_error:
+                error = request_error
+            category = policy.classify(response, error)
+            attempt = attempt + 1
+            if category != RETRY or not policy.should_retry(attempt, len(servers),
+                                                            error, idempotent):
+                return category, response, error
+            self._log("The %s request failed on server %s." % (method, server))
+            time.sleep(policy.backoff(attempt))
+
+    def _hand_off(self, operation, key, value=None, vector_clock=None,
+                  timeout=None):
+        """This method puts a failed write in the hinted handoff queue of the
+        cluster if it has one."""
+        if self._cluster.handoff is not None:
+            self._cluster.handoff.enqueue(operation, self._store_name, key, value,
+                                          vector_clock, timeout)
+            self._log("The %s of %s is queued for a later retry." % (operation, key))
+
+    def _handed_over(self, key):
+        """This method drops a queued write which is replaced by a successful
+        write."""
+        if self._cluster.handoff is not None:
+            self._cluster.handoff.discard(self._store_name, key)
+
+    def _cached(self, key):
+        """This method returns the value of a key from the cache of the cluster
+        or None if the key isn't cached."""
+        if self._cluster.cache is None:
+            return None
+        value = self._cluster.cache.get(self._cache_key(key))
+        if value is not None:
+            return value.decode()
+
+    def _cache_value(self, key, value):
+        if self._cluster.cache is not None:
+            self._cluster.cache.set(self._cache_key(key), value.encode())
+
+    def _invalidate(self, key):
+        if self._cluster.cache is not None:
+            self._cluster.cache.delete(self._cache_key(key))
+
+    def _cache_key(self, key):
+        return ("%s/%s" % (self._store_name, key)).encode()
+
     def _log(self, msg):
-        if self._debug:
+        if self._cluster.debug:
             logging.debug(msg)
 
+def _now_ms():
+    return int(time.time() * 1000)
+
+def _zone(server):
+    """This method returns the zone of a server tuple or None."""
+    return server[2] if len(server) > 2 else None
+
+def _parse_cluster_xml(path, scheme):
+    """This method reads the nodes of a cluster.xml.
+
+    Parameters
+    ----------
+    path : str
+        the path of the cluster.xml
+    scheme : str
+        the scheme of the urls
+
+    Returns
+    -------
+    list
+        the list of server tuples (url, node_id, zone_id)
+
+    Raises
+    ------
+    ValueError
+        If a node has no host or rest-port.
+    """
+    servers = []
+    for server in ElementTree.parse(path).getroot().iter("server"):
+        host = server.findtext("host")
+        rest_port = server.findtext("rest-port")
+        if host is None or rest_port is None:
+            raise ValueError("The node %s has no host or rest-port."
+                             % server.findtext("id"))
+        url = "%s://%s:%s" % (scheme, host.strip(), rest_port.strip())
+        zone_id = server.findtext("zone-id")
+        servers.append((url, int(server.findtext("id")),
+                        int(zone_id) if zone_id is not None else 0))
+    return servers
+
 def _is_valid(servers, store_name, debug, connection_timeout):
     """This method validates the constructor method parameters.
 
@@ -347,6 +1209,25 @@ def _is_valid(servers, store_name, debug, connection_timeout):
         valid = True
     return valid
 
+def _is_valid_cluster(servers, debug, connection_timeout):
+    """This method validates the cluster constructor method parameters.
+
+    Parameters
+    ----------
+    servers : list
+        the list of tuples of servers
+    debug : bool
+        the flag if the error messages should be printed
+    connection_timeout : int
+        the timeout for the reuqest
+
+    Returns
+    -------
+    bool
+        True if valid else False
+    """
+    return _is_valid_servers(servers) and _is_valid_debug(debug) and _is_valid_connection_timeout(connection_timeout)
+
 def _is_valid_servers(servers):
     """
     """
@@ -355,8 +1236,9 @@ def _is_valid_servers(servers):
     server_regex = re.compile(regex_pattern)
     if isinstance(servers, list):
         for server in servers:
-            if isinstance(server, tuple):
-                if isinstance(server[0], str) and isinstance(server[1], int):
+            if isinstance(server, tuple) and len(server) in (2, 3):
+                if (isinstance(server[0], str) and isinstance(server[1], int) and
+                        isinstance(server[-1], int)):
                     server_matcher = server_regex.match(server[0])
                     if server_matcher is not None:
                         continue
@@ -27,3 +27,17 @@ class RestError(VoldemortError):
     This is the base exception class for the connection handling.
     """
     pass
+
+class ObsoleteVersionError(VoldemortError):
+    """
+    This exception class is used if a newer version of a key exists on the
+    cluster.
+    """
+    pass
+
+class UnknownWriteError(RestError):
+    """
+    This exception class is used if the connection failed after a write was
+    sent, so it isn't known if the cluster applied the write.
+    """
+    pass
@@ -0,0 +1,262 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+This module contains the expiry handling of keys which are set with a timeout.
+The cluster doesn't remove such keys by itself, so the client remembers them in
+an index and a background thread deletes them when they are due.
+"""
+import heapq
+import logging
+import threading
+import time
+from voldemort_client.exception import RestError, VoldemortError
+from voldemort_client.scheduler import BATCH
+
+
+class ExpiryIndex:
+    """This class represents the index of the keys of one store which have an
+    expire time. The keys are hold in a min-heap ordered by the expire time, so
+    the due keys are found without a scan of all keys. A due key which is
+    being deleted stays expired until the delete is done or the key is written
+    again."""
+
+    def __init__(self):
+        """This is the constructor method of the class."""
+        self._heap = []
+        self._expires = {}
+        self._sweeping = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._expires)
+
+    def __contains__(self, key):
+        return key in self._expires
+
+    def add(self, key, expires):
+        """This method adds a key or changes its expire time.
+
+        Parameters
+        ----------
+        key : str
+            the key which expires
+        expires : int
+            the expire time as timestamp in milli seconds
+        """
+        with self._lock:
+            self._expires[key] = expires
+            self._sweeping.pop(key, None)
+            heapq.heappush(self._heap, (expires, key))
+            self._compact()
+
+    def remove(self, key):
+        """This method removes a key from the index.
+
+        Parameters
+        ----------
+        key : str
+            the key to remove
+        """
+        with self._lock:
+            self._expires.pop(key, None)
+            self._sweeping.pop(key, None)
+            self._compact()
+
+    def is_expired(self, key, now=None):
+        """This method checks if a key is expired.
+
+        Parameters
+        ----------
+        key : str
+            the key to check
+        now : int
+            the current time as timestamp in milli seconds
+
+        Returns
+        -------
+        bool
+            True if the key is expired else False
+        """
+        expires = self._expires.get(key, self._sweeping.get(key))
+        if expires is None:
+            return False
+        if now is None:
+            now = _now_ms()
+        return expires <= now
+
+    def pop_due(self, limit, now=None):
+        """This method removes the due keys from the index and returns them.
+        The keys are marked as being deleted until done or requeue is called
+        or the key is written again.
+
+        Parameters
+        ----------
+        limit : int
+            the maximal number of keys
+        now : int
+            the current time as timestamp in milli seconds
+
+        Returns
+        -------
+        list
+            the list of tuples (key, expires) ordered by the expire time
+        """
+        if now is None:
+            now = _now_ms()
+        due = []
+        with self._lock:
+            while self._heap and len(due) < limit and self._heap[0][0] <= now:
+                expires, key = heapq.heappop(self._heap)
+                if self._expires.get(key) == expires:
+                    del self._expires[key]
+                    self._sweeping[key] = expires
+                    due.append((key, expires))
+        return due
+
+    def is_sweeping(self, key, expires):
+        """This method checks if a due key wasn't written since pop_due.
+
+        Parameters
+        ----------
+        key : str
+            the due key
+        expires : int
+            the expire time which pop_due returned
+
+        Returns
+        -------
+        bool
+            True if the key should still be deleted else False
+        """
+        return self._sweeping.get(key) == expires
+
+    def done(self, key, expires):
+        """This method removes the mark of a due key which is deleted.
+
+        Parameters
+        ----------
+        key : str
+            the due key
+        expires : int
+            the expire time which pop_due returned
+        """
+        with self._lock:
+            if self._sweeping.get(key) == expires:
+                del self._sweeping[key]
+
+    def requeue(self, key, expires):
+        """This method puts a due key back into the index if it couldn't be
+        deleted and wasn't written in the meantime.
+
+        Parameters
+        ----------
+        key : str
+            the due key
+        expires : int
+            the expire time which pop_due returned
+        """
+        with self._lock:
+            if self._sweeping.get(key) != expires:
+                return
+            del self._sweeping[key]
+            self._expires[key] = expires
+            heapq.heappush(self._heap, (expires, key))
+
+    def _compact(self):
+        """This method rebuilds the heap if it holds too many entries of
+        removed or changed keys."""
+        if len(self._heap) > 2 * len(self._expires) + 64:
+            self._heap = [(expires, key) for key, expires in self._expires.items()]
+            heapq.heapify(self._heap)
+
+
+class ExpirySweeper(threading.Thread):
+    """This class represents the background thread which deletes the expired
+    keys of all stores of a cluster."""
+
+    def __init__(self, cluster, interval=1.0, batch_size=100):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        cluster : VoldemortCluster
+            the cluster whose expired keys should be deleted
+        interval : float
+            the pause between two batches in seconds
+        batch_size : int
+            the maximal number of deletes per batch
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid.
+        """
+        super().__init__(name="voldemort-expiry-sweeper", daemon=True)
+        if interval <= 0 or batch_size <= 0:
+            raise ValueError("The sweeper isn't correct initialised.")
+        self._cluster = cluster
+        self._interval = interval
+        self._batch_size = batch_size
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self.sweep()
+            except Exception as error:
+                logging.debug("The expired keys couldn't be deleted: %s", error)
+
+    def sweep(self):
+        """This method deletes one batch of expired keys with the batch
+        priority. The batch stops if the cluster isn't reachable and the due
+        keys are kept for the next batch.
+
+        Returns
+        -------
+        int
+            the number of deleted keys
+        """
+        deleted = 0
+        remaining = self._batch_size
+        for store_name, index in self._cluster.expiry_indexes():
+            if remaining <= 0:
+                break
+            due = index.pop_due(remaining)
+            remaining = remaining - len(due)
+            client = self._cluster.store(store_name, priority=BATCH)
+            for position, (key, expires) in enumerate(due):
+                try:
+                    if client.expire(key, expires):
+                        deleted = deleted + 1
+                except RestError as error:
+                    logging.debug("The expired keys couldn't be deleted: %s", error)
+                    for pending_key, pending_expires in due[position:]:
+                        index.requeue(pending_key, pending_expires)
+                    return deleted
+                except VoldemortError as error:
+                    logging.debug("The expired key %s couldn't be deleted: %s",
+                                  key, error)
+                index.requeue(key, expires)
+        return deleted
+
+    def stop(self):
+        """This method stops the thread and waits for the end of the current
+        batch."""
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
+
+
+def _now_ms():
+    return int(time.time() * 1000)
@@ -0,0 +1,328 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+This module contains the hinted handoff of writes which failed on every node.
+The writes are appended to a log on the local disk and a background thread
+sends them again when the nodes are back.
+
+The log is a list of segment files. Every record has a header with the length
+and the crc32 of its json payload, so a torn record at the end of the log is
+detected and dropped. A write is acknowledged with an extra record after it was
+replayed. Only the latest write of every key is kept, and the log is rewritten
+with the pending writes when it holds too many old records.
+"""
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+import simplejson as json
+from voldemort_client.scheduler import BATCH
+
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_PATTERN = "segment-%012d.log"
+
+
+class HintedHandoffQueue:
+    """This class represents the durable queue of the failed writes."""
+
+    def __init__(self, directory, segment_size=4 * 1024 * 1024, fsync_batch=32,
+                 fsync_interval=1.0):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        directory : str
+            the directory of the segment files
+        segment_size : int
+            the size in bytes after which a new segment is started
+        fsync_batch : int
+            the number of records after which the log is synced to the disk
+        fsync_interval : float
+            the seconds after which the log is synced to the disk
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid.
+        """
+        if segment_size <= 0 or fsync_batch <= 0 or fsync_interval < 0:
+            raise ValueError("The handoff queue isn't correct initialised.")
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._segment_size = segment_size
+        self._fsync_batch = fsync_batch
+        self._fsync_interval = fsync_interval
+        self._pending = {}
+        self._sequence = 0
+        self._records = 0
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        self._lock = threading.RLock()
+        self._segment = None
+        self._segment_id = 0
+        self._load()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def enqueue(self, operation, store_name, key, value=None, vector_clock=None,
+                timeout=None):
+        """This method appends a failed write to the log. An older pending
+        write of the same key is replaced.
+
+        Parameters
+        ----------
+        operation : str
+            "set" or "delete"
+        store_name : str
+            the name of the store
+        key : str
+            the key of the write
+        value : str
+            the value of a set
+        vector_clock : dict
+            the version the write was based on or None
+        timeout : int
+            the expire time as timestamp in milli seconds
+        """
+        with self._lock:
+            self._sequence = self._sequence + 1
+            record = {"seq": self._sequence, "op": operation, "store": store_name,
+                      "key": key, "value": value, "clock": vector_clock,
+                      "timeout": timeout}
+            self._append(record)
+            self._pending[(store_name, key)] = record
+
+    def discard(self, store_name, key):
+        """This method removes the pending write of a key, for example because
+        a newer write was successful.
+
+        Parameters
+        ----------
+        store_name : str
+            the name of the store
+        key : str
+            the key of the write
+        """
+        with self._lock:
+            record = self._pending.get((store_name, key))
+            if record is not None:
+                self.ack(record)
+
+    def ack(self, record):
+        """This method marks a write as replayed.
+
+        Parameters
+        ----------
+        record : dict
+            the record which was returned by pending
+        """
+        with self._lock:
+            current = self._pending.get((record["store"], record["key"]))
+            if current is None or current["seq"] != record["seq"]:
+                return
+            del self._pending[(record["store"], record["key"])]
+            self._append({"seq": record["seq"], "op": "ack",
+                          "store": record["store"], "key": record["key"]})
+            if self._records > 2 * len(self._pending) + 1024:
+                self.compact()
+
+    def pending(self, limit=None):
+        """This method returns the oldest pending writes.
+
+        Parameters
+        ----------
+        limit : int
+            the maximal number of writes
+
+        Returns
+        -------
+        list
+            the records ordered by their sequence number
+        """
+        with self._lock:
+            records = sorted(self._pending.values(), key=lambda record: record["seq"])
+        return records if limit is None else records[:limit]
+
+    def flush(self):
+        """This method syncs the log to the disk."""
+        with self._lock:
+            if self._segment is not None and self._unsynced:
+                self._segment.flush()
+                os.fsync(self._segment.fileno())
+            self._unsynced = 0
+            self._synced_at = time.monotonic()
+
+    def compact(self):
+        """This method rewrites the log with the pending writes only and removes
+        the old segments."""
+        with self._lock:
+            old_segments = self._segments()
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            self._segment_id = self._segment_id + 1
+            self._records = 0
+            self._unsynced = 0
+            for record in sorted(self._pending.values(), key=lambda item: item["seq"]):
+                self._append(record, sync=False)
+            self.flush()
+            for segment_id in old_segments:
+                os.remove(self._path(segment_id))
+
+    def close(self):
+        """This method syncs and closes the log."""
+        with self._lock:
+            self.flush()
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+    def _append(self, record, sync=True):
+        payload = json.dumps(record).encode()
+        if self._segment is None:
+            self._segment = open(self._path(self._segment_id), "ab")
+        elif self._segment.tell() >= self._segment_size:
+            self.flush()
+            self._segment.close()
+            self._segment_id = self._segment_id + 1
+            self._segment = open(self._path(self._segment_id), "ab")
+        self._segment.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._records = self._records + 1
+        self._unsynced = self._unsynced + 1
+        if sync and (self._unsynced >= self._fsync_batch or
+                     time.monotonic() - self._synced_at >= self._fsync_interval):
+            self.flush()
+
+    def _load(self):
+        """This method reads the existing segments and rebuilds the pending
+        writes."""
+        segments = self._segments()
+        for segment_id in segments:
+            for record in _read_segment(self._path(segment_id)):
+                self._records = self._records + 1
+                self._sequence = max(self._sequence, record["seq"])
+                key = (record["store"], record["key"])
+                if record["op"] == "ack":
+                    current = self._pending.get(key)
+                    if current is not None and current["seq"] == record["seq"]:
+                        del self._pending[key]
+                else:
+                    self._pending[key] = record
+        if segments:
+            self._segment_id = segments[-1]
+            self.compact()
+
+    def _segments(self):
+        segment_ids = []
+        for name in os.listdir(self._directory):
+            if name.startswith("segment-") and name.endswith(".log"):
+                segment_ids.append(int(name[len("segment-"):-len(".log")]))
+        return sorted(segment_ids)
+
+    def _path(self, segment_id):
+        return os.path.join(self._directory, SEGMENT_PATTERN % segment_id)
+
+
+class HandoffReplayer(threading.Thread):
+    """This class represents the background thread which sends the pending
+    writes of the handoff queue again."""
+
+    def __init__(self, cluster, queue, interval=1.0, rate=50):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        cluster : VoldemortCluster
+            the cluster which gets the writes
+        queue : HintedHandoffQueue
+            the queue of the failed writes
+        interval : float
+            the pause between two rounds in seconds
+        rate : int
+            the maximal number of writes per round
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid.
+        """
+        super().__init__(name="voldemort-handoff-replayer", daemon=True)
+        if interval <= 0 or rate <= 0:
+            raise ValueError("The replayer isn't correct initialised.")
+        self._cluster = cluster
+        self._queue = queue
+        self._interval = interval
+        self._rate = rate
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self.replay()
+            except Exception as error:
+                logging.debug("The pending writes couldn't be replayed: %s", error)
+
+    def replay(self):
+        """This method sends one round of pending writes with the batch
+        priority. The round stops at the first write which finds the cluster
+        unreachable, so an outage doesn't get a request for every pending
+        write. A write which raises stays in the queue and is skipped.
+
+        Returns
+        -------
+        int
+            the number of replayed writes
+        """
+        replayed = 0
+        for record in self._queue.pending(self._rate):
+            client = self._cluster.store(record["store"], priority=BATCH)
+            try:
+                done = client.replay_write(record["op"], record["key"],
+                                           record["value"], record["clock"],
+                                           record["timeout"])
+            except Exception as error:
+                logging.debug("The pending write of %s couldn't be replayed: %s",
+                              record["key"], error)
+                continue
+            if not done:
+                break
+            self._queue.ack(record)
+            replayed = replayed + 1
+        self._queue.flush()
+        return replayed
+
+    def stop(self):
+        """This method stops the thread and waits for the end of the current
+        round."""
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
+
+
+def _read_segment(path):
+    """This method reads the records of one segment and stops at the first
+    torn or corrupt record."""
+    with open(path, "rb") as segment:
+        while True:
+            header = segment.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            length, checksum = RECORD_HEADER.unpack(header)
+            payload = segment.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            yield json.loads(payload.decode())
@@ -0,0 +1,418 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+This module contains the builder of voldemort read-only stores and a local
+lookup engine for the built files.
+
+The files use the read-only format version 2 (ro2). Every key belongs to a
+master partition, which is the fnv hash of the key modulo the number of
+partitions like in the consistent routing strategy of voldemort, and to a chunk,
+which is taken from the md5 hash of the key. Every chunk of a partition has an
+index and a data file named {partition}_{replica}_{chunk}. The index file is a
+sorted list of entries of the first 8 bytes of the md5 hash and the position in
+the data file. At the position the data file has the number of keys with this
+hash prefix and for every key the key size, the value size, the key and the
+value. All numbers are big-endian like in java. The keys must be serialized
+like the serializer of the store does it, for a string store this is utf-8.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import simplejson as json
+
+INDEX_ENTRY = struct.Struct(">8si")
+SPILL_HEADER = struct.Struct(">II")
+COUNT = struct.Struct(">h")
+SIZES = struct.Struct(">ii")
+HASH_SIZE = 8
+FNV_BASIS = 0x811c9dc5
+FNV_PRIME = (1 << 24) + 0x193
+MAX_POSITION = 2 ** 31 - 1
+
+
+class ReadOnlyStoreBuilder:
+    """This class represents the offline builder of the chunk files of a
+    read-only store."""
+
+    def __init__(self, output_dir, num_partitions, num_chunks=1,
+                 replication_factor=1, partition_owners=None, processes=None):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        output_dir : str
+            the directory of the built files
+        num_partitions : int
+            the number of partitions of the cluster
+        num_chunks : int
+            the number of chunks per partition
+        replication_factor : int
+            the number of replicas of every key
+        partition_owners : dict
+            the node id of every partition, if given the files of every node
+            are written to the directory node-{id}
+        processes : int
+            the number of processes which write the chunks, None for the number
+            of cpus
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid.
+        """
+        if num_partitions <= 0 or num_chunks <= 0 or replication_factor <= 0:
+            raise ValueError("The builder isn't correct initialised.")
+        if replication_factor > 1 and partition_owners is None:
+            raise ValueError("The replicas need the partition owners.")
+        if (partition_owners is not None and
+                len(set(partition_owners.values())) < replication_factor):
+            raise ValueError("The cluster has less nodes than replicas.")
+        self._output_dir = output_dir
+        self._num_partitions = num_partitions
+        self._num_chunks = num_chunks
+        self._replication_factor = replication_factor
+        self._partition_owners = partition_owners
+        self._processes = processes
+
+    def build(self, pairs):
+        """This method writes the chunk files of all key-value pairs. The pairs
+        are first split into one temporary file per chunk and then every chunk
+        is sorted and written by a worker process.
+
+        Parameters
+        ----------
+        pairs : iterable
+            the key-value pairs as str or bytes, a later pair of the same key
+            replaces the earlier one
+
+        Returns
+        -------
+        dict
+            the number of keys and of written chunks
+        """
+        os.makedirs(self._output_dir, exist_ok=True)
+        spill_dir = tempfile.mkdtemp(dir=self._output_dir)
+        try:
+            spills = {}
+            try:
+                for key, value in pairs:
+                    key = _to_bytes(key)
+                    value = _to_bytes(value)
+                    bucket = (master_partition(key, self._num_partitions),
+                              chunk(key, self._num_chunks))
+                    spill = spills.get(bucket)
+                    if spill is None:
+                        spill = open(os.path.join(spill_dir, "%d_%d" % bucket), "wb")
+                        spills[bucket] = spill
+                    spill.write(SPILL_HEADER.pack(len(key), len(value)) + key + value)
+            finally:
+                for spill in spills.values():
+                    spill.close()
+            tasks = [(os.path.join(spill_dir, "%d_%d" % bucket),
+                      self._chunk_paths(*bucket))
+                     for bucket in sorted(spills)]
+            if self._processes == 1:
+                counts = [_write_chunk(task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers=self._processes) as executor:
+                    counts = list(executor.map(_write_chunk, tasks))
+            self._write_empty_chunks(set(spills))
+        finally:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+        return {"keys": sum(counts), "chunks": len(tasks)}
+
+    def _chunk_paths(self, partition, chunk_id):
+        """This method returns the base paths of the files of one chunk for
+        every replica."""
+        paths = []
+        for replica, owner in enumerate(self._replicas(partition)):
+            directory = self._output_dir
+            if owner is not None:
+                directory = os.path.join(directory, "node-%d" % owner)
+            paths.append(os.path.join(directory, "%d_%d_%d" % (partition, replica,
+                                                               chunk_id)))
+        return paths
+
+    def _replicas(self, partition):
+        """This method returns the owner of every replica of a partition. The
+        replicas are the next partitions on the ring which belong to other
+        nodes."""
+        if self._partition_owners is None:
+            return [None]
+        owners = []
+        for step in range(self._num_partitions):
+            owner = self._partition_owners[(partition + step) % self._num_partitions]
+            if owner not in owners:
+                owners.append(owner)
+            if len(owners) == self._replication_factor:
+                break
+        return owners
+
+    def _write_empty_chunks(self, written):
+        """This method writes empty files for the chunks without keys, because
+        the server expects every chunk, and the metadata file of every
+        node."""
+        directories = set()
+        for partition in range(self._num_partitions):
+            for chunk_id in range(self._num_chunks):
+                for path in self._chunk_paths(partition, chunk_id):
+                    directories.add(os.path.dirname(path))
+                    if (partition, chunk_id) in written:
+                        continue
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    open(path + ".index", "wb").close()
+                    open(path + ".data", "wb").close()
+        for directory in directories:
+            with open(os.path.join(directory, ".metadata"), "w") as metadata:
+                json.dump({"format": "ro2"}, metadata)
+
+
+class ReadOnlyStore:
+    """This class represents the local lookup engine of the files of a
+    read-only store. The files are memory-mapped and the index is searched
+    binary, so a lookup reads only a few pages and returns the value without a
+    copy."""
+
+    def __init__(self, directory, num_partitions, num_chunks=1):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        directory : str
+            the directory of the chunk files of one node
+        num_partitions : int
+            the number of partitions of the cluster
+        num_chunks : int
+            the number of chunks per partition
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid.
+        """
+        if num_partitions <= 0 or num_chunks <= 0:
+            raise ValueError("The store isn't correct initialised.")
+        self._num_partitions = num_partitions
+        self._num_chunks = num_chunks
+        self._chunks = {}
+        for name in os.listdir(directory):
+            if not name.endswith(".index"):
+                continue
+            partition, replica, chunk_id = (int(part) for part in
+                                            name[:-len(".index")].split("_"))
+            base = os.path.join(directory, name[:-len(".index")])
+            self._chunks.setdefault((partition, chunk_id), []).append(
+                (replica, _map(base + ".index"), _map(base + ".data")))
+        for replicas in self._chunks.values():
+            replicas.sort(key=lambda replica: replica[0])
+
+    def get(self, key):
+        """This method returns the value of a key.
+
+        Parameters
+        ----------
+        key : str
+            the key to lookup, str keys are encoded as utf-8
+
+        Returns
+        -------
+        memoryview
+            the value as view on the mapped data file or None, the view keeps
+            the file mapped until it is released
+        """
+        key = _to_bytes(key)
+        key_hash = hashlib.md5(key).digest()
+        replicas = self._chunks.get((master_partition(key, self._num_partitions),
+                                     chunk(key, self._num_chunks)), [])
+        for _, index, data in replicas:
+            position = _search(index, key_hash[:HASH_SIZE])
+            if position is not None:
+                return _read_value(data, position, key)
+        return None
+
+    def close(self):
+        """This method unmaps all files. A file whose values are still held by
+        the caller is unmapped when the last of them is released."""
+        chunks = self._chunks
+        self._chunks = {}
+        for replicas in chunks.values():
+            for _, index, data in replicas:
+                for memory in (index, data):
+                    if memory is None:
+                        continue
+                    try:
+                        memory.close()
+                    except BufferError:
+                        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def master_partition(key, num_partitions):
+    """This method returns the master partition of a key like the consistent
+    routing strategy of voldemort with the fnv hash.
+
+    Parameters
+    ----------
+    key : bytes
+        the serialized key
+    num_partitions : int
+        the number of partitions
+
+    Returns
+    -------
+    int
+        the id of the master partition
+    """
+    value = FNV_BASIS
+    for byte in key:
+        value = ((value ^ byte) * FNV_PRIME) & 0xFFFFFFFFFFFFFFFF
+    return _routing_abs(_to_int32(value)) % num_partitions
+
+
+def chunk(key, num_chunks):
+    """This method returns the chunk of a key from its md5 hash. The first int
+    of the hash is widened to a long before its absolute value is taken, so
+    the minimal int gives 2^31.
+
+    Parameters
+    ----------
+    key : bytes
+        the serialized key
+    num_chunks : int
+        the number of chunks
+
+    Returns
+    -------
+    int
+        the id of the chunk
+    """
+    first = struct.unpack(">i", hashlib.md5(key).digest()[:4])[0]
+    return abs(first) % num_chunks
+
+
+def _write_chunk(task):
+    """This method sorts the pairs of one chunk and writes its index and data
+    files for every replica.
+
+    Parameters
+    ----------
+    task : tuple
+        the path of the temporary file and the base paths of the replicas
+
+    Returns
+    -------
+    int
+        the number of keys
+    """
+    spill_path, paths = task
+    groups = {}
+    with open(spill_path, "rb") as spill:
+        while True:
+            header = spill.read(SPILL_HEADER.size)
+            if not header:
+                break
+            key_size, value_size = SPILL_HEADER.unpack(header)
+            key = spill.read(key_size)
+            value = spill.read(value_size)
+            groups.setdefault(hashlib.md5(key).digest()[:HASH_SIZE], {})[key] = value
+    os.makedirs(os.path.dirname(paths[0]), exist_ok=True)
+    position = 0
+    with open(paths[0] + ".index", "wb") as index, open(paths[0] + ".data", "wb") as data:
+        for key_hash in sorted(groups):
+            if position > MAX_POSITION:
+                raise ValueError("The chunk is too large, use more chunks.")
+            index.write(INDEX_ENTRY.pack(key_hash, position))
+            entry = [COUNT.pack(len(groups[key_hash]))]
+            for key, value in groups[key_hash].items():
+                entry.append(SIZES.pack(len(key), len(value)))
+                entry.append(key)
+                entry.append(value)
+            entry = b"".join(entry)
+            data.write(entry)
+            position = position + len(entry)
+    for path in paths[1:]:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(paths[0] + ".index", path + ".index")
+        shutil.copyfile(paths[0] + ".data", path + ".data")
+    return sum(len(group) for group in groups.values())
+
+
+def _search(index, key_hash):
+    """This method searches the position of a hash prefix in a mapped index."""
+    if index is None:
+        return None
+    low = 0
+    high = len(index) // INDEX_ENTRY.size - 1
+    while low <= high:
+        middle = (low + high) // 2
+        offset = middle * INDEX_ENTRY.size
+        current = index[offset:offset + HASH_SIZE]
+        if current < key_hash:
+            low = middle + 1
+        elif current > key_hash:
+            high = middle - 1
+        else:
+            return INDEX_ENTRY.unpack_from(index, offset)[1]
+    return None
+
+
+def _read_value(data, position, key):
+    """This method reads the value of a key from the entry at the position of
+    a mapped data file."""
+    view = memoryview(data)
+    count = COUNT.unpack_from(data, position)[0]
+    offset = position + COUNT.size
+    for _ in range(count):
+        key_size, value_size = SIZES.unpack_from(data, offset)
+        offset = offset + SIZES.size
+        if view[offset:offset + key_size] == key:
+            offset = offset + key_size
+            return view[offset:offset + value_size]
+        offset = offset + key_size + value_size
+    return None
+
+
+def _map(path):
+    """This method maps a file read-only, empty files can't be mapped."""
+    if os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb") as mapped_file:
+        return mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _to_bytes(value):
+    return value.encode() if isinstance(value, str) else bytes(value)
+
+
+def _to_int32(value):
+    value = value & 0xFFFFFFFF
+    return value - 2 ** 32 if value >= 2 ** 31 else value
+
+
+def _routing_abs(value):
+    """This method returns the absolute value of an int like the consistent
+    routing strategy of voldemort, which maps the minimal int to the maximal
+    int."""
+    if value == -2 ** 31:
+        return 2 ** 31 - 1
+    return abs(value)
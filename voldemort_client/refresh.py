@@ -0,0 +1,176 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+This module contains the refresh-ahead loader for hot keys. The loader holds
+the values of the hot keys in memory and a background thread checks their
+versions, so reads of these keys never wait for the cluster.
+"""
+import logging
+import threading
+
+
+class RefreshAheadLoader:
+    """This class represents the local copy of the hot keys of one store. The
+    values are revalidated in the background: first the cheap version of every
+    key is fetched and only the changed values are fetched again together with
+    their version. The shared cache is not asked, because it may still hold
+    the value of an older version which another host has overwritten."""
+
+    def __init__(self, client, interval=5.0, hot_threshold=None, max_keys=1000):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        client : VoldemortClient
+            the client of the store
+        interval : float
+            the pause between two refreshes in seconds
+        hot_threshold : int
+            the number of reads in one interval after which a key is registered
+            automatically, None to register keys only by hand
+        max_keys : int
+            the maximal number of registered keys
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid.
+        """
+        if interval <= 0 or max_keys <= 0 or (hot_threshold is not None and
+                                              hot_threshold <= 0):
+            raise ValueError("The loader isn't correct initialised.")
+        self._client = client
+        self._interval = interval
+        self._hot_threshold = hot_threshold
+        self._max_keys = max_keys
+        self._entries = {}
+        self._registered = set()
+        self._reads = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def register(self, keys):
+        """This method registers keys which should be refreshed. The values are
+        loaded with the next refresh.
+
+        Parameters
+        ----------
+        keys : list
+            the keys to register
+        """
+        with self._lock:
+            for key in keys:
+                if len(self._registered) >= self._max_keys:
+                    break
+                self._registered.add(key)
+
+    def unregister(self, key):
+        """This method stops the refresh of a key.
+
+        Parameters
+        ----------
+        key : str
+            the key to remove
+        """
+        with self._lock:
+            self._registered.discard(key)
+            self._entries.pop(key, None)
+
+    def get(self, key):
+        """This method returns the value of a key. Loaded keys are returned from
+        memory, all other keys are fetched with the client.
+
+        Parameters
+        ----------
+        key : str
+            the key to fetch
+
+        Returns
+        -------
+        str
+            the value of the key or None
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry[0]
+        if self._hot_threshold is not None:
+            with self._lock:
+                reads = self._reads.get(key, 0) + 1
+                self._reads[key] = reads
+            if reads >= self._hot_threshold:
+                self.register([key])
+        return self._client.get(key)
+
+    def refresh(self):
+        """This method revalidates all registered keys.
+
+        Returns
+        -------
+        int
+            the number of refetched values
+        """
+        with self._lock:
+            keys = list(self._registered)
+            self._reads.clear()
+        changed = []
+        for key in keys:
+            version = self._client.get_version(key)
+            entry = self._entries.get(key)
+            if version is None:
+                self._store(key, None, None)
+            elif entry is None or entry[1] != version:
+                changed.append(key)
+        for key in changed:
+            value, version = self._client.get_versioned(key)
+            if value is None:
+                self._drop(key)
+            else:
+                self._store(key, value, version)
+        return len(changed)
+
+    def start(self):
+        """This method starts the background thread."""
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name="voldemort-refresh-ahead")
+            self._thread.start()
+
+    def stop(self):
+        """This method stops the background thread."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _store(self, key, value, version):
+        with self._lock:
+            if key in self._registered:
+                self._entries[key] = (value, version)
+
+    def _drop(self, key):
+        """This method forgets the value of a key which has a version but
+        couldn't be fetched, so the next get asks the cluster again."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as error:
+                logging.debug("The hot keys couldn't be refreshed: %s", error)
+            if self._stopped.wait(self._interval):
+                break
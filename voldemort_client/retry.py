@@ -0,0 +1,262 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+This module contains the retry policy of the requests to the cluster. The
+policy decides which failures are retried on the next node, how long the
+client waits before and how many retries the client may send at all. The
+retries are paid from a token bucket which is filled by the normal requests,
+so an outage doesn't multiply the load on the remaining nodes.
+"""
+import random
+import threading
+import time
+from requests.exceptions import ConnectTimeout, ConnectionError, Timeout
+from urllib3.exceptions import NewConnectionError
+
+SUCCESS = "success"
+RETRY = "retry"
+NOT_FOUND = "not_found"
+CONFLICT = "conflict"
+FATAL = "fatal"
+
+RETRY_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+
+class RetryBudget:
+    """This class represents the token bucket of the retries. Every request
+    adds a part of a token and every retry needs a whole token. A small number
+    of retries per second is always allowed, so a client with little traffic
+    can retry too."""
+
+    def __init__(self, ratio=0.1, min_per_second=10, capacity=100):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        ratio : float
+            the part of a token which every request adds
+        min_per_second : float
+            the tokens which are added every second
+        capacity : float
+            the maximal number of tokens
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid.
+        """
+        if ratio < 0 or min_per_second < 0 or capacity <= 0:
+            raise ValueError("The retry budget isn't correct initialised.")
+        self._ratio = ratio
+        self._min_per_second = min_per_second
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        """This method adds the tokens of one request."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._capacity, self._tokens + self._ratio)
+
+    def withdraw(self):
+        """This method takes the token of one retry.
+
+        Returns
+        -------
+        bool
+            True if the retry is allowed else False
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens = self._tokens - 1
+                return True
+            return False
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity,
+                           self._tokens + (now - self._updated) * self._min_per_second)
+        self._updated = now
+
+
+class RetryPolicy:
+    """This class represents the retry policy which all operations of a cluster
+    use."""
+
+    def __init__(self, max_attempts=None, base_delay=0.01, max_delay=1.0,
+                 budget=None, retry_status_codes=RETRY_STATUS_CODES):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        max_attempts : int
+            the maximal number of attempts of one request, None for one attempt
+            per node
+        base_delay : float
+            the maximal pause before the first retry in seconds, it doubles
+            with every retry
+        max_delay : float
+            the upper limit of the pause in seconds
+        budget : RetryBudget
+            the token bucket of the retries, None for the default budget
+        retry_status_codes : tuple
+            the http status codes which are retried
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid.
+        """
+        if ((max_attempts is not None and max_attempts <= 0) or base_delay < 0 or
+                max_delay < base_delay):
+            raise ValueError("The retry policy isn't correct initialised.")
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._budget = budget if budget is not None else RetryBudget()
+        self._retry_status_codes = set(retry_status_codes)
+        self._stats = {"requests": 0, "retries": 0, "rejected": 0}
+
+    @property
+    def stats(self):
+        """dict: the number of requests, retries and retries which the budget
+        rejected"""
+        return dict(self._stats)
+
+    def classify(self, response=None, error=None):
+        """This method sorts the result of one attempt into a category.
+
+        Parameters
+        ----------
+        response : requests.Response
+            the response of the node or None
+        error : Exception
+            the connection error or None
+
+        Returns
+        -------
+        str
+            SUCCESS, RETRY, NOT_FOUND, CONFLICT or FATAL
+        """
+        if error is not None:
+            if isinstance(error, (ConnectionError, Timeout)):
+                return RETRY
+            return FATAL
+        if response.status_code == 404:
+            return NOT_FOUND
+        if response.status_code == 412:
+            return CONFLICT
+        if response.status_code in self._retry_status_codes:
+            return RETRY
+        if response.status_code >= 400:
+            return FATAL
+        return SUCCESS
+
+    def start(self):
+        """This method counts a new request and fills the retry budget."""
+        self._stats["requests"] += 1
+        self._budget.deposit()
+
+    def should_retry(self, attempt, nodes, error=None, idempotent=True):
+        """This method decides if a failed attempt is retried.
+
+        Parameters
+        ----------
+        attempt : int
+            the number of the done attempts
+        nodes : int
+            the number of nodes of the cluster
+        error : Exception
+            the connection error of the attempt or None
+        idempotent : bool
+            if false an attempt which may have reached the node isn't retried
+
+        Returns
+        -------
+        bool
+            True if the request should be retried else False
+        """
+        max_attempts = self._max_attempts if self._max_attempts is not None else nodes
+        if attempt >= max_attempts:
+            return False
+        if not idempotent and not is_unsent(error):
+            return False
+        if not self._budget.withdraw():
+            self._stats["rejected"] += 1
+            return False
+        self._stats["retries"] += 1
+        return True
+
+    def backoff(self, attempt):
+        """This method returns the pause before a retry.
+
+        Parameters
+        ----------
+        attempt : int
+            the number of the done attempts
+
+        Returns
+        -------
+        float
+            the pause in seconds
+        """
+        return full_jitter(attempt - 1, self._base_delay, self._max_delay)
+
+
+def full_jitter(retry, base_delay, max_delay):
+    """This method returns a random pause with exponential backoff and full
+    jitter.
+
+    Parameters
+    ----------
+    retry : int
+        the number of the retry starting with 0
+    base_delay : float
+        the maximal pause of the first retry in seconds
+    max_delay : float
+        the upper limit of the pause in seconds
+
+    Returns
+    -------
+    float
+        the pause in seconds
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** retry))
+
+
+def is_unsent(error):
+    """This method checks if a failed attempt surely failed before the request
+    was sent. Only a timeout or a refused connection while connecting prove
+    this, a reset or a closed connection may happen after the body was sent.
+
+    Parameters
+    ----------
+    error : Exception
+        the connection error of the attempt or None
+
+    Returns
+    -------
+    bool
+        True if the request never reached the node else False
+    """
+    if isinstance(error, ConnectTimeout):
+        return True
+    if not isinstance(error, ConnectionError) or isinstance(error, Timeout):
+        return False
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, "reason", reason)
+    return isinstance(reason, NewConnectionError)
@@ -0,0 +1,216 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+This module contains the scheduler of the requests to the nodes. Every request
+has a priority class. The scheduler limits the number of open requests per
+node and chooses the next waiting request with weighted fair queueing, so a
+flood of batch requests doesn't delay the interactive requests.
+"""
+from collections import deque
+import threading
+import time
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+
+class RequestScheduler:
+    """This class represents the scheduler of the requests of one cluster."""
+
+    def __init__(self, weights=None, max_concurrency=8, reserved=2,
+                 preemptible=(BATCH,)):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        weights : dict
+            the weight of every priority class, the default is 8 for
+            interactive and 1 for batch requests
+        max_concurrency : int
+            the maximal number of open requests per node
+        reserved : int
+            the number of open requests per node which are kept free for the
+            classes which are not preemptible
+        preemptible : tuple
+            the priority classes which are overtaken by the other classes and
+            don't use the reserved requests
+
+        Raises
+        ------
+        ValueError
+            If the input parameters not valid.
+        """
+        if weights is None:
+            weights = {INTERACTIVE: 8, BATCH: 1}
+        if (not weights or any(weight <= 0 for weight in weights.values()) or
+                max_concurrency <= 0 or not 0 <= reserved < max_concurrency):
+            raise ValueError("The scheduler isn't correct initialised.")
+        self._weights = dict(weights)
+        self._max_concurrency = max_concurrency
+        self._reserved = reserved
+        self._preemptible = set(preemptible)
+        self._nodes = {}
+        self._stats = {priority: {"dispatched": 0, "wait": 0.0, "max_wait": 0.0}
+                       for priority in self._weights}
+        self._condition = threading.Condition()
+
+    def acquire(self, node_id, priority=INTERACTIVE):
+        """This method waits until a request of the priority class may be sent
+        to the node.
+
+        Parameters
+        ----------
+        node_id : int
+            the id of the node
+        priority : str
+            the priority class of the request
+
+        Raises
+        ------
+        ValueError
+            If the priority class is unknown.
+        """
+        if priority not in self._weights:
+            raise ValueError("The priority class %s is unknown." % priority)
+        ticket = _Ticket(priority)
+        with self._condition:
+            node = self._node(node_id)
+            node.queues[priority].append(ticket)
+            self._dispatch(node)
+            while not ticket.ready:
+                self._condition.wait()
+            wait = time.monotonic() - ticket.enqueued
+            stats = self._stats[priority]
+            stats["dispatched"] += 1
+            stats["wait"] += wait
+            stats["max_wait"] = max(stats["max_wait"], wait)
+
+    def release(self, node_id):
+        """This method marks a request to the node as done.
+
+        Parameters
+        ----------
+        node_id : int
+            the id of the node
+        """
+        with self._condition:
+            node = self._node(node_id)
+            node.in_flight = node.in_flight - 1
+            self._dispatch(node)
+
+    def slot(self, node_id, priority=INTERACTIVE):
+        """This method returns a context manager which holds one request to the
+        node.
+
+        Parameters
+        ----------
+        node_id : int
+            the id of the node
+        priority : str
+            the priority class of the request
+
+        Returns
+        -------
+        _Slot
+            the context manager
+        """
+        return _Slot(self, node_id, priority)
+
+    def stats(self):
+        """This method returns the queue statistics of every priority class.
+
+        Returns
+        -------
+        dict
+            the current queue depth, the number of dispatched requests, the
+            total and the maximal wait time in seconds of every class
+        """
+        with self._condition:
+            result = {}
+            for priority, stats in self._stats.items():
+                result[priority] = dict(stats)
+                result[priority]["queued"] = sum(len(node.queues[priority])
+                                                 for node in self._nodes.values())
+            return result
+
+    def _node(self, node_id):
+        node = self._nodes.get(node_id)
+        if node is None:
+            node = _NodeState(self._weights)
+            self._nodes[node_id] = node
+        return node
+
+    def _dispatch(self, node):
+        """This method starts the waiting requests of the node while it has
+        free capacity. The lock must be held."""
+        dispatched = False
+        while node.in_flight < self._max_concurrency:
+            best = None
+            best_tag = None
+            for priority, queue in node.queues.items():
+                if not queue:
+                    continue
+                if (priority in self._preemptible and
+                        node.in_flight >= self._max_concurrency - self._reserved):
+                    continue
+                tag = max(node.virtual, node.finish[priority]) + 1.0 / self._weights[priority]
+                if best_tag is None or tag < best_tag:
+                    best = priority
+                    best_tag = tag
+            if best is None:
+                break
+            node.finish[best] = best_tag
+            node.virtual = best_tag - 1.0 / self._weights[best]
+            node.queues[best].popleft().ready = True
+            node.in_flight = node.in_flight + 1
+            dispatched = True
+        if dispatched:
+            self._condition.notify_all()
+
+
+class _NodeState:
+    """This class holds the queues of one node."""
+
+    def __init__(self, weights):
+        self.queues = {priority: deque() for priority in weights}
+        self.finish = {priority: 0.0 for priority in weights}
+        self.virtual = 0.0
+        self.in_flight = 0
+
+
+class _Ticket:
+    """This class represents one waiting request."""
+
+    __slots__ = ("priority", "enqueued", "ready")
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.ready = False
+
+
+class _Slot:
+    """This class is the context manager of one request."""
+
+    def __init__(self, scheduler, node_id, priority):
+        self._scheduler = scheduler
+        self._node_id = node_id
+        self._priority = priority
+
+    def __enter__(self):
+        self._scheduler.acquire(self._node_id, self._priority)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._scheduler.release(self._node_id)
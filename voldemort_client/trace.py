@@ -0,0 +1,353 @@
+# Copyright 2017 Mirko Lelansky <mlelansky@mail.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+This module contains the recording of the traffic of a client and the replay
+of such a recording. It is used to test changes of the client with the same
+traffic as in production.
+
+A trace file starts with a header and has one binary record per operation. A
+record holds the operation, the outcome, the start time and the duration in
+micro seconds, the size of the values and the keys. The keys are stored as
+hash by default, so a trace contains no data of the store. A record holds at
+most 65535 keys and unhashed keys are cut after 65535 bytes.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import struct
+import threading
+import time
+
+MAGIC = b"VOLDTRC1"
+FILE_HEADER = struct.Struct("<8sB")
+RECORD_HEADER = struct.Struct("<BBQIIH")
+KEY_LENGTH = struct.Struct("<H")
+HASH_SIZE = 8
+MAX_KEYS = 0xFFFF
+MAX_KEY_LENGTH = 0xFFFF
+
+OPERATIONS = {1: "get", 2: "get_many", 3: "set", 4: "delete", 5: "get_version"}
+OPERATION_CODES = {name: code for code, name in OPERATIONS.items()}
+READ_OPERATIONS = ("get", "get_many", "get_version")
+
+HIT = 0
+MISS = 1
+ERROR = 2
+
+TraceRecord = namedtuple("TraceRecord", ["operation", "outcome", "start",
+                                         "duration", "value_size", "keys"])
+
+
+class TraceRecorder:
+    """This class represents a trace file which is written."""
+
+    def __init__(self, path, hash_keys=True):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        path : str
+            the path of the trace file
+        hash_keys : bool
+            if true store only a hash of the keys
+        """
+        self._file = open(path, "wb")
+        self._file.write(FILE_HEADER.pack(MAGIC, int(hash_keys)))
+        self._hash_keys = hash_keys
+        self._origin = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, operation, keys, value_size, start, duration, outcome):
+        """This method writes one record.
+
+        Parameters
+        ----------
+        operation : str
+            the name of the client method
+        keys : list
+            the keys of the operation
+        value_size : int
+            the size of the values in bytes
+        start : float
+            the start time of the operation from time.monotonic
+        duration : float
+            the duration of the operation in seconds
+        outcome : int
+            HIT, MISS or ERROR
+        """
+        keys = keys[:MAX_KEYS]
+        encoded = b"".join(self._encode_key(key) for key in keys)
+        header = RECORD_HEADER.pack(OPERATION_CODES[operation], outcome,
+                                    max(0, int((start - self._origin) * 1e6)),
+                                    min(0xFFFFFFFF, int(duration * 1e6)),
+                                    min(0xFFFFFFFF, value_size), len(keys))
+        with self._lock:
+            self._file.write(header + encoded)
+
+    def close(self):
+        """This method flushes and closes the trace file."""
+        with self._lock:
+            self._file.close()
+
+    def _encode_key(self, key):
+        data = key.encode()
+        if self._hash_keys:
+            return hashlib.blake2b(data, digest_size=HASH_SIZE).digest()
+        data = data[:MAX_KEY_LENGTH]
+        return KEY_LENGTH.pack(len(data)) + data
+
+
+class RecordingClient:
+    """This class wraps a client and records every get, get_many, set,
+    delete and get_version call. All other attributes are taken from the
+    wrapped client."""
+
+    def __init__(self, client, recorder):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        client : VoldemortClient
+            the client which does the work
+        recorder : TraceRecorder
+            the recorder of the calls
+        """
+        self._client = client
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def get(self, key):
+        return self._call("get", [key], self._client.get, key)
+
+    def get_many(self, keys):
+        return self._call("get_many", keys, self._client.get_many, keys)
+
+    def set(self, key, value, timeout=None):
+        return self._call("set", [key], self._client.set, key, value, timeout,
+                          value_size=len(value.encode()))
+
+    def delete(self, key):
+        return self._call("delete", [key], self._client.delete, key)
+
+    def get_version(self, key):
+        return self._call("get_version", [key], self._client.get_version, key)
+
+    def _call(self, operation, keys, method, *args, value_size=None):
+        start = time.monotonic()
+        try:
+            result = method(*args)
+        except Exception:
+            self._recorder.record(operation, keys, value_size or 0, start,
+                                  time.monotonic() - start, ERROR)
+            raise
+        duration = time.monotonic() - start
+        if value_size is None:
+            value_size = _result_size(result)
+        outcome = MISS if result is None or result is False else HIT
+        self._recorder.record(operation, keys, value_size, start, duration,
+                              outcome)
+        return result
+
+
+class TraceReplayer:
+    """This class replays a trace file against a client and measures the
+    latencies."""
+
+    def __init__(self, path):
+        """This is the constructor method of the class.
+
+        Parameters
+        ----------
+        path : str
+            the path of the trace file
+        """
+        self._path = path
+
+    def prepare(self, client):
+        """This method writes the keys which the recorded reads found, so the
+        reads of a replay find them too. Every key gets a value of the
+        recorded size, the size of a get_many is split over its keys. Hashed
+        keys are written as hex strings like in the replay.
+
+        Parameters
+        ----------
+        client : VoldemortClient
+            the client of the target store
+
+        Returns
+        -------
+        int
+            the number of written keys
+        """
+        sizes = {}
+        for record in read_trace(self._path):
+            if record.outcome != HIT or record.operation not in READ_OPERATIONS:
+                continue
+            size = record.value_size // max(1, len(record.keys))
+            for key in record.keys:
+                sizes[key] = max(size, sizes.get(key, 0))
+        for key, size in sizes.items():
+            client.set(key, "x" * size)
+        return len(sizes)
+
+    def replay(self, client, speed=1.0, concurrency=4):
+        """This method sends the recorded operations again with the recorded
+        distances. Hashed keys are replayed as hex strings and the values are
+        filled up to the recorded size. The latency is measured from the time
+        at which the operation should have started, so the time an operation
+        waits for a free worker is part of its latency.
+
+        Parameters
+        ----------
+        client : VoldemortClient
+            the client which sends the requests
+        speed : float
+            the factor of the replay speed, 0 replays without pauses
+        concurrency : int
+            the maximal number of operations at the same time
+
+        Returns
+        -------
+        dict
+            the latency report of every operation, see :py:func:`report`
+        """
+        latencies = {}
+        errors = {}
+        lock = threading.Lock()
+
+        def run(record, start):
+            try:
+                _replay_record(client, record)
+                failed = False
+            except Exception:
+                failed = True
+            duration = time.monotonic() - start
+            with lock:
+                latencies.setdefault(record.operation, []).append(duration)
+                if failed:
+                    errors[record.operation] = errors.get(record.operation, 0) + 1
+
+        origin = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for record in read_trace(self._path):
+                if speed > 0:
+                    start = origin + record.start / 1e6 / speed
+                    pause = start - time.monotonic()
+                    if pause > 0:
+                        time.sleep(pause)
+                else:
+                    start = time.monotonic()
+                executor.submit(run, record, start)
+        return report(latencies, errors)
+
+
+def read_trace(path):
+    """This method reads the records of a trace file.
+
+    Parameters
+    ----------
+    path : str
+        the path of the trace file
+
+    Returns
+    -------
+    generator
+        the records as TraceRecord tuples
+
+    Raises
+    ------
+    ValueError
+        If the file isn't a trace file.
+    """
+    with open(path, "rb") as trace:
+        header = trace.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size or header[:len(MAGIC)] != MAGIC:
+            raise ValueError("The file isn't a trace file.")
+        hashed = bool(FILE_HEADER.unpack(header)[1])
+        while True:
+            data = trace.read(RECORD_HEADER.size)
+            if len(data) < RECORD_HEADER.size:
+                return
+            (code, outcome, start, duration, value_size,
+             key_count) = RECORD_HEADER.unpack(data)
+            keys = []
+            for _ in range(key_count):
+                if hashed:
+                    keys.append(trace.read(HASH_SIZE).hex())
+                else:
+                    length = KEY_LENGTH.unpack(trace.read(KEY_LENGTH.size))[0]
+                    keys.append(trace.read(length).decode(errors="replace"))
+            yield TraceRecord(OPERATIONS[code], outcome, start, duration,
+                              value_size, keys)
+
+
+def report(latencies, errors=None):
+    """This method builds the latency report of some operations.
+
+    Parameters
+    ----------
+    latencies : dict
+        the list of durations in seconds of every operation
+    errors : dict
+        the number of failed calls of every operation
+
+    Returns
+    -------
+    dict
+        the count, errors, p50, p90, p99 and max in milli seconds of every
+        operation
+    """
+    errors = errors or {}
+    result = {}
+    for operation, durations in latencies.items():
+        durations = sorted(durations)
+        result[operation] = {
+            "count": len(durations),
+            "errors": errors.get(operation, 0),
+            "p50": _percentile(durations, 50) * 1000,
+            "p90": _percentile(durations, 90) * 1000,
+            "p99": _percentile(durations, 99) * 1000,
+            "max": durations[-1] * 1000
+        }
+    return result
+
+
+def _replay_record(client, record):
+    if record.operation == "get":
+        client.get(record.keys[0])
+    elif record.operation == "get_many":
+        client.get_many(record.keys)
+    elif record.operation == "set":
+        client.set(record.keys[0], "x" * record.value_size)
+    elif record.operation == "delete":
+        client.delete(record.keys[0])
+    else:
+        client.get_version(record.keys[0])
+
+
+def _result_size(result):
+    if isinstance(result, str):
+        return len(result.encode())
+    if isinstance(result, dict):
+        return sum(len(value.encode()) for value in result.values()
+                   if isinstance(value, str))
+    return 0
+
+
+def _percentile(values, percent):
+    """This method returns the nearest-rank percentile of sorted values."""
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(index)]